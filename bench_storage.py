@@ -0,0 +1,56 @@
+"""保存形式（JSON / バイナリ / メモリマップ）の読み書き時間とファイルサイズを比較する
+
+使い方: python bench_storage.py [タスク数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import task_storage
+
+def make_document(count):
+    rng = random.Random(0)
+    base = datetime(2024, 4, 1)
+    subjects = ['線形代数', '英語', 'プログラミング演習', '物理学実験', '経済学入門', 'ゼミ発表']
+    kinds = ['レポート', '課題', '小テスト', '発表準備']
+    tasks = []
+    for i in range(1, count + 1):
+        deadline = base + timedelta(days=rng.randrange(180), hours=rng.choice([9, 13, 18, 23]))
+        tasks.append({
+            'id': i,
+            'name': f"{rng.choice(subjects)} {rng.choice(kinds)} 第{rng.randrange(1, 16)}回",
+            'deadline': deadline.strftime('%Y-%m-%d %H:00'),
+            'priority': rng.randrange(1, 4),
+            'completed': rng.random() < 0.4
+        })
+    return {'tasks': tasks, 'next_id': count + 1}
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    document = make_document(count)
+    print(f"タスク数: {count}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in task_storage.FORMATS:
+            path = os.path.join(tmp, f"tasks.{fmt}")
+
+            start = time.perf_counter()
+            task_storage.save_document(path, document, fmt)
+            save_sec = time.perf_counter() - start
+
+            start = time.perf_counter()
+            loaded, detected = task_storage.load_document(path)
+            load_sec = time.perf_counter() - start
+            assert detected == fmt and loaded == document
+
+            size = os.path.getsize(path)
+            if os.path.exists(f"{path}.names"):
+                # メモリマップ形式はタスク名を別ファイルに持つ
+                size += os.path.getsize(f"{path}.names")
+            size_kb = size / 1024
+            print(f"  {fmt:6s}  保存 {save_sec * 1000:8.1f}ms  読込 {load_sec * 1000:8.1f}ms  サイズ {size_kb:10.1f}KB")
+
+if __name__ == '__main__':
+    main()
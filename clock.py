@@ -0,0 +1,46 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+class SystemClock:
+    """実時間の時計"""
+
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class VirtualClock:
+    """手動で進める仮想時計（シミュレーション用）
+
+    sleep() は待たずに時刻を進めるだけなので、何週間分の動作も一瞬で再生できる。
+    """
+
+    def __init__(self, start=None):
+        self.current = start or datetime.now().replace(second=0, microsecond=0)
+        self.origin = self.current
+        self.lock = threading.Lock()
+
+    def now(self):
+        return self.current
+
+    def monotonic(self):
+        return (self.current - self.origin).total_seconds()
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        with self.lock:
+            self.current += timedelta(seconds=seconds)
+
+    def advance_to(self, when):
+        with self.lock:
+            if when > self.current:
+                self.current = when
+
+SYSTEM_CLOCK = SystemClock()
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from clock import SYSTEM_CLOCK
+
+# 各時間帯でチェック（時間、キー、ラベル）
+TIME_WINDOWS = [
+    (6, '6h', '6時間'),
+    (3, '3h', '3時間'),
+    (1, '1h', '1時間')
+]
+
+class DeadlineChecker:
+    """締め切りが近いタスクを通知（6時間、3時間、1時間前）
+
+    時計・通知先・ログ出力を差し替えられるので、GUIなしで仮想時間の再生にも使える。
+    """
+
+    def __init__(self, manager, ledger, notify, clock=SYSTEM_CLOCK, log=print):
+        self.manager = manager
+        self.ledger = ledger
+        self.notify = notify
+        self.clock = clock
+        self.log = log
+
+    def next_check_time(self):
+        """現在より後の次の毎時00分（ちょうど00分なら1時間後）"""
+        now = self.clock.now()
+        return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+    def check(self):
+        """1回分のチェックを行い、通知した (キー, ラベル, タスク一覧) のリストを返す"""
+        now = self.clock.now()
+        # Tkスレッドの書き込みと競合しないよう、不変のスナップショットを読む
+        active_tasks = self.manager.snapshot().get_active_tasks()
+        self.log(f"[締め切りチェック] アクティブなタスク数: {len(active_tasks)}")
+
+        # 期限切れ・完了済みタスクの通知フラグを整理
+        self.ledger.prune(active_tasks, now)
+
+        alerts = []
+        for hours, key, label in TIME_WINDOWS:
+            tasks_to_alert = []
+
+            for task in active_tasks:
+                task_id = task['id']
+
+                # すでにこの時間帯で通知済みならスキップ
+                if self.ledger.is_notified(task_id, key):
+                    continue
+
+                try:
+                    # 期限をdatetimeに変換（時刻は必須）
+                    deadline_dt = datetime.strptime(task['deadline'], '%Y-%m-%d %H:%M')
+
+                    # 締め切りまでの残り時間を計算
+                    time_remaining = deadline_dt - now
+                    hours_remaining = time_remaining.total_seconds() / 3600
+
+                    # ちょうど指定時間前（1時間の範囲: hours-1 < 残り時間 <= hours）
+                    if hours - 1 < hours_remaining <= hours:
+                        tasks_to_alert.append(task)
+                        self.ledger.mark(task_id, key)
+                        self.log(f"[締め切りチェック] タスク「{task['name']}」: 残り{hours_remaining:.2f}時間 → {label}前通知対象に追加")
+                except Exception as e:
+                    self.log(f"[締め切りチェック] エラー: {e}")
+                    continue
+
+            if tasks_to_alert:
+                # タスク名を列挙
+                task_names = '\n'.join([f"・{t['name']}" for t in tasks_to_alert[:5]])
+                if len(tasks_to_alert) > 5:
+                    task_names += f"\n...他{len(tasks_to_alert) - 5}件"
+
+                self.log(f"[通知] {label}前: {len(tasks_to_alert)}件")
+                self.notify(
+                    f"締め切り{label}前",
+                    f"{len(tasks_to_alert)}件のタスクが{label}前です\n\n{task_names}"
+                )
+                alerts.append((key, label, tasks_to_alert))
+
+        self.ledger.save()
+        return alerts
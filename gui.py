@@ -1,34 +1,350 @@
+import time
+_STARTUP_T0 = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 from datetime import datetime, timedelta
-from tkcalendar import Calendar
-from task_manager import TaskManager
+from task_manager import open_task_manager
+from mmap_store import MappedTaskStore
+from notification_ledger import NotificationLedger
+from notification_dispatcher import NotificationDispatcher, MessageBoxSink, ToastSink
+from deadline_checker import DeadlineChecker
+from clock import SYSTEM_CLOCK
 import threading
-import time
-from PIL import Image, ImageDraw
-import pystray
+import heapq
+import os
+from collections import defaultdict
 import platform
 
+def user_cache_dir():
+    """ユーザーごとのキャッシュディレクトリ（インストール先が書き込めなくても使える）"""
+    system = platform.system()
+    if system == 'Windows':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif system == 'Darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'univ_taskmanager')
+
+# トレイアイコンの描画済み画像（初回起動時に生成してキャッシュ）
+TRAY_ICON_CACHE = os.path.join(user_cache_dir(), 'tray_icon.png')
+
+PRIORITY_LABELS = {1: '低', 2: '中', 3: '高'}
+PRIORITY_VALUES = {'低': 1, '中': 2, '高': 3}
+TIME_VALUES = [f"{h:02d}:00" for h in range(1, 24)] + ["23:59"]
+
+def parse_quick_add(text, now=None):
+    """クイック追加の入力を (タスク名, 期限日, 時刻, 優先度) に分解
+
+    日付: 今日 / 明日 / 明後日 / +3d / 12/15 / 2024-12-15 / 2024/12/15
+    時刻: 18:00 / 18時
+    優先度: !高 / !中 / !低
+    日付・時刻以外の語はタスク名として扱う。
+    """
+    if now is None:
+        now = datetime.now()
+    today = now.date()
+    
+    deadline = None
+    deadline_time = '23:59'
+    priority = 2
+    name_parts = []
+    
+    relative_days = {'今日': 0, '本日': 0, '明日': 1, '明後日': 2}
+    
+    for token in text.split():
+        if token in relative_days:
+            deadline = today + timedelta(days=relative_days[token])
+            continue
+        if token.startswith('!') and token[1:] in PRIORITY_VALUES:
+            priority = PRIORITY_VALUES[token[1:]]
+            continue
+        if token.startswith('+') and token.endswith('d') and token[1:-1].isdigit():
+            deadline = today + timedelta(days=int(token[1:-1]))
+            continue
+        
+        parsed_date = None
+        for fmt in ('%Y-%m-%d', '%Y/%m/%d'):
+            try:
+                parsed_date = datetime.strptime(token, fmt).date()
+                break
+            except ValueError:
+                pass
+        if parsed_date is None:
+            try:
+                # 年を省略した場合、過ぎた日付なら来年とみなす
+                month_day = datetime.strptime(token, '%m/%d')
+                parsed_date = month_day.replace(year=today.year).date()
+                if parsed_date < today:
+                    parsed_date = parsed_date.replace(year=today.year + 1)
+            except ValueError:
+                pass
+        if parsed_date is not None:
+            deadline = parsed_date
+            continue
+        
+        time_token = token[:-1] + ':00' if token.endswith('時') else token
+        try:
+            deadline_time = datetime.strptime(time_token, '%H:%M').strftime('%H:%M')
+            continue
+        except ValueError:
+            pass
+        
+        name_parts.append(token)
+    
+    if deadline is None:
+        deadline = today
+    return ' '.join(name_parts), deadline.strftime('%Y-%m-%d'), deadline_time, priority
+
+class TaskEditorDialog:
+    """追加・編集共用のタスク入力ダイアログ
+
+    Toplevelとカレンダーは起動後のアイドル時に1度だけ構築しておき
+    （間に合わなければ最初に開いたとき）、開くたびに値だけ差し替える。
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.task_id = None  # 編集中のタスクID（追加時はNone）
+        self.calendar_window = None
+        self.calendar = None
+        
+        dialog = tk.Toplevel(app.root)
+        dialog.withdraw()
+        dialog.geometry("400x300")
+        dialog.transient(app.root)
+        dialog.protocol("WM_DELETE_WINDOW", self.hide)
+        self.dialog = dialog
+        
+        frame = tk.Frame(dialog, bg='#d3d3d3')
+        frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        tk.Label(frame, text="タスク名", bg='#d3d3d3', font=("Arial", 10)).grid(row=0, column=0, sticky='w', pady=10)
+        self.name_entry = tk.Entry(frame, width=30, bg='white', fg='black', font=("Arial", 10))
+        self.name_entry.grid(row=0, column=1, pady=10, padx=10)
+        
+        tk.Label(frame, text="期限日", bg='#d3d3d3', font=("Arial", 10)).grid(row=1, column=0, sticky='w', pady=10)
+        deadline_frame = tk.Frame(frame, bg='#d3d3d3')
+        deadline_frame.grid(row=1, column=1, pady=10, padx=10, sticky='w')
+        self.deadline_var = tk.StringVar()
+        deadline_entry = tk.Entry(deadline_frame, textvariable=self.deadline_var, width=23, bg='white', fg='black', font=("Arial", 10), state='readonly')
+        deadline_entry.pack(side=tk.LEFT)
+        
+        cal_button = tk.Button(deadline_frame, text="📅", command=self.open_calendar,
+                              bg='#1e5a7d', fg='white', font=("Arial", 10, "bold"), width=3)
+        cal_button.pack(side=tk.LEFT, padx=2)
+        
+        tk.Label(frame, text="時刻", bg='#d3d3d3', font=("Arial", 10)).grid(row=2, column=0, sticky='w', pady=10)
+        time_frame = tk.Frame(frame, bg='#d3d3d3')
+        time_frame.grid(row=2, column=1, pady=10, padx=10, sticky='w')
+        self.time_var = tk.StringVar()
+        time_combo = ttk.Combobox(time_frame, textvariable=self.time_var,
+                                 values=TIME_VALUES,
+                                 width=23, state='readonly')
+        time_combo.pack(side=tk.LEFT)
+        
+        tk.Label(frame, text="優先度", bg='#d3d3d3', font=("Arial", 10)).grid(row=3, column=0, sticky='w', pady=10)
+        priority_frame = tk.Frame(frame, bg='#d3d3d3')
+        priority_frame.grid(row=3, column=1, pady=10, padx=10, sticky='w')
+        self.priority_var = tk.StringVar()
+        priority_combo = ttk.Combobox(priority_frame, textvariable=self.priority_var, 
+                                     values=['低', '中', '高'], 
+                                     width=23, state='readonly')
+        priority_combo.pack(side=tk.LEFT)
+        
+        button_frame = tk.Frame(frame, bg='#d3d3d3')
+        button_frame.grid(row=4, column=0, columnspan=2, pady=20)
+        
+        self.submit_btn = tk.Button(button_frame, command=self.on_submit,
+                                    font=("Arial", 10), width=12)
+        self.submit_btn.pack(side=tk.LEFT, padx=10)
+        
+        cancel_btn = tk.Button(button_frame, text="キャンセル", command=self.hide,
+                              font=("Arial", 10), width=12)
+        cancel_btn.pack(side=tk.LEFT, padx=10)
+        
+        dialog.bind('<Return>', lambda e: self.on_submit())
+        dialog.bind('<Escape>', lambda e: self.hide())
+    
+    def open_add(self):
+        self.task_id = None
+        self.populate("タスク追加", "追加する", '', datetime.now().strftime('%Y-%m-%d'), '23:59', 2)
+    
+    def open_edit(self, task):
+        # 現在の期限から日付と時刻を分離
+        if ' ' in task['deadline']:
+            current_date, current_time = task['deadline'].split(' ')
+        else:
+            current_date = task['deadline']
+            current_time = '23:59'
+        
+        self.task_id = task['id']
+        self.populate("タスク編集", "保存", task['name'], current_date, current_time, task['priority'])
+    
+    def populate(self, title, submit_text, name, deadline, deadline_time, priority):
+        self.dialog.title(title)
+        self.submit_btn.config(text=submit_text)
+        self.name_entry.delete(0, tk.END)
+        self.name_entry.insert(0, name)
+        self.deadline_var.set(deadline)
+        self.time_var.set(deadline_time)
+        self.priority_var.set(PRIORITY_LABELS.get(priority, '中'))
+        
+        self.dialog.deiconify()
+        self.dialog.lift()
+        self.dialog.grab_set()
+        self.name_entry.focus_set()
+    
+    def hide(self):
+        if self.calendar_window is not None:
+            self.calendar_window.withdraw()
+        self.dialog.grab_release()
+        self.dialog.withdraw()
+    
+    def build_calendar(self):
+        if self.calendar_window is None:
+            # tkcalendarは起動後のアイドル時か初回使用時に読み込む
+            from tkcalendar import Calendar
+            cal_window = tk.Toplevel(self.dialog)
+            cal_window.withdraw()
+            cal_window.title("期限を選択")
+            cal_window.geometry("300x300")
+            cal_window.transient(self.dialog)
+            cal_window.protocol("WM_DELETE_WINDOW", self.close_calendar)
+            
+            now = datetime.now()
+            self.calendar = Calendar(cal_window, selectmode='day', date_pattern='yyyy-mm-dd',
+                                     year=now.year, month=now.month, day=now.day,
+                                     background='white', foreground='black',
+                                     headersbackground='#1e5a7d', headersforeground='white',
+                                     selectbackground='#4a90d9', selectforeground='white',
+                                     normalbackground='white', normalforeground='black',
+                                     weekendbackground='#f0f0f0', weekendforeground='black')
+            self.calendar.pack(pady=20, padx=20)
+            
+            tk.Button(cal_window, text="選択", command=self.select_date, font=("Arial", 10), width=10).pack(pady=10)
+            self.calendar_window = cal_window
+    
+    def open_calendar(self):
+        self.build_calendar()
+        
+        # 現在の期限日を選択状態にして表示
+        try:
+            current = datetime.strptime(self.deadline_var.get(), '%Y-%m-%d').date()
+            self.calendar.selection_set(current)
+            self.calendar.see(current)
+        except ValueError:
+            pass
+        
+        self.calendar_window.deiconify()
+        self.calendar_window.lift()
+        self.calendar_window.grab_set()
+    
+    def select_date(self):
+        self.deadline_var.set(self.calendar.get_date())
+        self.close_calendar()
+    
+    def close_calendar(self):
+        self.calendar_window.grab_release()
+        self.calendar_window.withdraw()
+        # ダイアログ側にモーダルを戻す
+        self.dialog.grab_set()
+    
+    def on_submit(self):
+        name = self.name_entry.get().strip()
+        deadline = self.deadline_var.get().strip()
+        deadline_time = self.time_var.get().strip()
+        priority = PRIORITY_VALUES.get(self.priority_var.get(), 2)
+        
+        if not name or not deadline:
+            messagebox.showwarning("入力エラー", "タスク名と期限を入力してください")
+            return
+        
+        if self.task_id is None:
+            self.app.manager.add_task(name, deadline, priority, deadline_time)
+        else:
+            old_task = self.app.manager.get_task(self.task_id)
+            old_deadline = old_task['deadline'] if old_task else None
+            new_deadline = f"{deadline} {deadline_time}"
+            self.app.manager.update_task(self.task_id, name, new_deadline, priority)
+            # 期限が変わると通知時刻も変わるので通知済みフラグをやり直す
+            # （名前や優先度だけの変更では、通知済みの通知を出し直さない）
+            if new_deadline != old_deadline:
+                self.app.notification_ledger.discard(self.task_id)
+                self.app.notification_ledger.save()
+        self.app.load_task_list()
+        self.hide()
+
 class TaskManagerGUI:
+    # 最初の描画で挿入する行数（残りは描画後に分割して挿入）
+    FIRST_SCREEN_ROWS = 20
+    ROW_CHUNK_SIZE = 200
+    
     def __init__(self, root):
         self.root = root
         self.root.title("学生タスク管理ツール")
         self.root.geometry("1400x700")
         
-        self.manager = TaskManager()
+        self.startup_timings = []  # [(ラベル, 起動からのミリ秒)]
+        self.mark_startup("モジュール読み込み")
+        
+        self.manager = open_task_manager()
+        self.mark_startup("タスク読み込み")
         self.selected_tasks = set()
         self.view_mode = 'active'
         self.sort_by = None
         self.sort_reverse = False
+        self.render_generation = 0
+        self.pending_rows = []  # 分割挿入を待っている (タスク, 親ID)
+        # 期限・日付の切り替わりで行を差し替えるための索引
+        self.task_items = {}  # {task_id: 行ID}
+        self.day_rows = defaultdict(set)  # {期限日: {task_id}}
+        self.deadline_heap = []  # [(期限, task_id)]
+        self.deadline_job = None
+        self.midnight_job = None
+        self.task_editor = None
+        self.summary_window = None
         self.tray_icon = None
         self.is_closing = False
-        self.notified_tasks = {}  # {task_id: {'6h': bool, '3h': bool, '1h': bool}}
+        # 通知済みフラグ（タスクデータの隣に保存し、再起動後も重複通知しない）
+        self.notification_ledger = NotificationLedger(self.manager.json_file)
+        
+        # 通知は専用スレッドで重複排除・まとめ・レート制限して配送
+        messagebox_sink = MessageBoxSink(self.root)
+        if platform.system() == 'Windows':
+            # エラー時はメッセージボックスにフォールバック
+            sinks = [ToastSink(fallback=messagebox_sink)]
+        else:
+            # Linux等ではメッセージボックス
+            sinks = [messagebox_sink]
+        self.notifier = NotificationDispatcher(sinks).start()
+        
+        # 時計は差し替え可能（シミュレーションでは仮想時計を使う）
+        self.clock = SYSTEM_CLOCK
+        self.deadline_checker = DeadlineChecker(self.manager, self.notification_ledger,
+                                                self.show_notification, self.clock)
         
         # ウィンドウを閉じる時の処理を上書き
         self.root.protocol("WM_DELETE_WINDOW", self.hide_window)
         
         self.setup_ui()
+        self.mark_startup("UI構築")
         self.load_task_list()
+        self.mark_startup("先頭画面のタスク挿入")
+        
+        # 通知・トレイ・定期チェックは最初の描画が終わってから起動
+        self.root.after_idle(lambda: self.root.after(0, self.start_deferred_subsystems))
+    
+    def mark_startup(self, label):
+        """起動からの経過時間を記録"""
+        elapsed_ms = (time.perf_counter() - _STARTUP_T0) * 1000
+        self.startup_timings.append((label, elapsed_ms))
+        print(f"[起動] {label}: {elapsed_ms:.1f}ms")
+    
+    def start_deferred_subsystems(self):
+        """初回描画後に起動するサブシステム"""
+        self.mark_startup("初回描画")
         
         # 起動時の通知
         self.root.after(1000, self.show_startup_notification)
@@ -38,6 +354,18 @@ class TaskManagerGUI:
         
         # 定期的なタスクチェック（1時間ごと）
         self.start_periodic_check()
+        self.mark_startup("サブシステム起動")
+        
+        # 追加・編集ダイアログは次のアイドル時に非表示のまま構築しておく
+        self.root.after_idle(self.prebuild_task_editor)
+    
+    def prebuild_task_editor(self):
+        editor = self.get_task_editor()
+        try:
+            editor.build_calendar()
+        except ImportError as e:
+            print(f"カレンダーを準備できませんでした: {e}")
+        self.mark_startup("ダイアログ構築")
     
     def setup_ui(self):
         button_frame = tk.Frame(self.root)
@@ -71,9 +399,31 @@ class TaskManagerGUI:
                                   width=12, height=2)
         active_button.pack(side=tk.LEFT, padx=8)
         
+        next_button = tk.Button(button_frame, text="次にやること",
+                                command=self.show_next_tasks,
+                                bg="#6a4c93", fg="white",
+                                font=("Arial", 14, "bold"),
+                                width=12, height=2)
+        next_button.pack(side=tk.LEFT, padx=8)
+        
+        summary_button = tk.Button(button_frame, text="集計",
+                                   command=self.show_summary_panel,
+                                   bg="#5a5a5a", fg="white",
+                                   font=("Arial", 14, "bold"),
+                                   width=8, height=2)
+        summary_button.pack(side=tk.LEFT, padx=8)
+        
         button_frame_right = tk.Frame(self.root)
         button_frame_right.pack(pady=0, padx=10, anchor='e')
         
+        # クイック追加（例: "レポート提出 明日 18:00 !高"）
+        tk.Label(button_frame_right, text="クイック追加", font=("Arial", 12)).pack(side=tk.LEFT, padx=4)
+        self.quick_add_var = tk.StringVar()
+        quick_add_entry = tk.Entry(button_frame_right, textvariable=self.quick_add_var,
+                                   width=40, font=("Arial", 12))
+        quick_add_entry.pack(side=tk.LEFT, padx=8)
+        quick_add_entry.bind('<Return>', self.quick_add_task)
+        
         complete_button = tk.Button(button_frame_right, text="完了にする",
                                     command=self.complete_selected_tasks,
                                     bg="#1e5a7d", fg="white",
@@ -95,8 +445,10 @@ class TaskManagerGUI:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         columns = ('選択', '番号', 'タイトル', '期限', '優先度', '操作')
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings',
+        # サブタスクは親の下に字下げして表示（左端の列で折りたたみ）
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show='tree headings',
                                  yscrollcommand=scrollbar.set, height=15)
+        self.tree.column('#0', width=50, stretch=False)
         
         self.tree.heading('選択', text='')
         self.tree.heading('番号', text='番号')
@@ -123,12 +475,17 @@ class TaskManagerGUI:
         
         self.tree.bind('<Button-1>', self.on_tree_click)
         self.tree.bind('<Button-3>', self.show_context_menu)
+        # 元に戻す / やり直し
+        self.root.bind('<Control-z>', self.undo_last_action)
+        self.root.bind('<Control-y>', self.redo_last_action)
         self.tree.heading('期限', text='期限', command=lambda: self.sort_by_column('deadline'))
         self.tree.heading('優先度', text='優先度', command=lambda: self.sort_by_column('priority'))
         
         self.context_menu = tk.Menu(self.root, tearoff=0)
         self.context_menu.add_command(label="編集", command=self.edit_task_from_menu)
         self.context_menu.add_command(label="完了", command=self.complete_task_from_menu)
+        self.context_menu.add_command(label="親タスクを設定", command=self.set_parent_from_menu)
+        self.context_menu.add_command(label="先行タスクを設定", command=self.set_blockers_from_menu)
         self.context_menu.add_separator()
         self.context_menu.add_command(label="削除", command=self.delete_task_from_menu)
         
@@ -174,8 +531,30 @@ class TaskManagerGUI:
             self.tree.delete(item)
         
         self.selected_tasks.clear()
+        self.task_items.clear()
+        self.day_rows.clear()
+        
+        rows, upcoming = self.visible_rows()
+        
+        # 先頭の1画面分だけ先に挿入し、残りは描画後に分割して挿入
+        self.render_generation += 1
+        for task, parent_id in rows[:self.FIRST_SCREEN_ROWS]:
+            self.insert_task_row(task, parent_id=parent_id)
         
+        self.pending_rows = rows[self.FIRST_SCREEN_ROWS:]
+        if self.pending_rows:
+            self.root.after_idle(self.insert_remaining_rows, self.render_generation)
+        
+        heapq.heapify(upcoming)
+        self.deadline_heap = upcoming
+        self.schedule_deadline_refresh()
+        self.schedule_midnight_refresh()
+    
+    def visible_rows(self):
+        """表示モードと並び順に従った (タスク, 親ID) の行と、表示中に期限を迎えるタスクを返す"""
         now = datetime.now()
+        # 表示中に期限を迎えるタスク（通常表示では消え、期限切れ表示では現れる）
+        upcoming = []
         
         if self.view_mode == 'active':
             # 通常表示: 未完了かつ期限が過ぎていないタスク
@@ -185,6 +564,7 @@ class TaskManagerGUI:
                     task_deadline = datetime.strptime(t['deadline'], '%Y-%m-%d %H:%M')
                     if task_deadline >= now:
                         tasks_to_show.append(t)
+                        upcoming.append((task_deadline, t['id']))
                 except:
                     # 日付の解析に失敗した場合は表示
                     tasks_to_show.append(t)
@@ -200,77 +580,253 @@ class TaskManagerGUI:
                     task_deadline = datetime.strptime(t['deadline'], '%Y-%m-%d %H:%M')
                     if task_deadline < now:
                         tasks_to_show.append(t)
+                    else:
+                        upcoming.append((task_deadline, t['id']))
                 except:
                     if t['deadline'] < now.strftime('%Y-%m-%d'):
                         tasks_to_show.append(t)
+        elif self.view_mode == 'next':
+            # 今すぐ取り組めるタスク（並びは実質の期限順のまま）
+            tasks_to_show = self.manager.next_tasks()
         else:
             tasks_to_show = self.manager.get_active_tasks()
         
         active_tasks = tasks_to_show
         
-        if self.sort_by == 'deadline':
+        if self.sort_by == 'deadline' and self.view_mode != 'next':
             active_tasks = sorted(active_tasks, key=lambda t: t['deadline'], reverse=self.sort_reverse)
         elif self.sort_by == 'priority':
             priority_order = {'低': 1, '中': 3, '高': 5}
             active_tasks = sorted(active_tasks, key=lambda t: t['priority'], reverse=not self.sort_reverse)
         
-        for task in active_tasks:
-            task_id = str(task['id']).zfill(3)
-            
-            deadline = task['deadline']
-            is_completed = task.get('completed', False)
-            
-            try:
-                # 時刻を含む形式で解析（時刻は必須）
-                deadline_dt = datetime.strptime(deadline, '%Y-%m-%d %H:%M')
-                has_time = True
-                
-                today_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                days_diff = (deadline_dt.replace(hour=0, minute=0, second=0, microsecond=0) - today_date).days
-                
-                # 色分け判定用（時刻追加前）
-                is_today = (days_diff == 0)
-                is_tomorrow = (days_diff == 1)
-                
-                if days_diff < 0:
-                    deadline_display = deadline_dt.strftime('%m/%d')
-                elif days_diff == 0:
-                    deadline_display = "本日"
-                elif days_diff == 1:
-                    deadline_display = "明日"
-                else:
-                    deadline_display = deadline_dt.strftime('%m/%d')
-                
-                # 時刻を追加表示
-                if has_time and deadline_dt.strftime('%H:%M') != '23:59':
-                    deadline_display += f" {deadline_dt.strftime('%H:%M')}"
-            except:
-                deadline_display = deadline
-                is_today = False
-                is_tomorrow = False
-            
-            priority_map = {1: '低', 2: '中', 3: '高'}
-            priority_display = priority_map.get(task['priority'], '中')
+        if self.view_mode == 'next':
+            # 「次にやること」は親子を組まずに一列で並べる
+            rows = [(task, None) for task in active_tasks]
+        else:
+            rows = self.arrange_subtasks(active_tasks)
+        return rows, upcoming
+    
+    def arrange_subtasks(self, tasks):
+        """サブタスクが親の直後に来るように並べ替え、(タスク, 親ID) のリストを返す
+
+        兄弟どうしは元の並び順を保つ。親が表示対象にない場合は最上位に置く。
+        """
+        graph = self.manager.graph
+        shown = {t['id'] for t in tasks}
+        roots = []
+        children = defaultdict(list)
+        for task in tasks:
+            parent_id = graph.parent_of(task['id'])
+            if parent_id in shown:
+                children[parent_id].append(task)
+            else:
+                roots.append(task)
+        
+        rows = []
+        stack = [(task, None) for task in reversed(roots)]
+        while stack:
+            task, parent_id = stack.pop()
+            rows.append((task, parent_id))
+            stack.extend((child, task['id']) for child in reversed(children.get(task['id'], ())))
+        return rows
+    
+    def insert_remaining_rows(self, generation):
+        # 挿入中に再描画された場合は古い挿入を中止
+        if generation != self.render_generation:
+            return
+        chunk = self.pending_rows[:self.ROW_CHUNK_SIZE]
+        self.pending_rows = self.pending_rows[self.ROW_CHUNK_SIZE:]
+        for task, parent_id in chunk:
+            # 期限を迎えて先に挿入した行は飛ばす
+            if task['id'] not in self.task_items:
+                self.insert_task_row(task, parent_id=parent_id)
+        if self.pending_rows:
+            self.root.after(1, self.insert_remaining_rows, generation)
+    
+    def task_row_style(self, task):
+        """行の表示値・タグ・背景色を求める"""
+        task_id = str(task['id']).zfill(3)
+        
+        deadline = task['deadline']
+        deadline_date = None
+        
+        try:
+            # 時刻を含む形式で解析（時刻は必須）
+            deadline_dt = datetime.strptime(deadline, '%Y-%m-%d %H:%M')
+            has_time = True
+            deadline_date = deadline_dt.date()
             
-            is_high_priority = task['priority'] == 3
+            today_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            days_diff = (deadline_dt.replace(hour=0, minute=0, second=0, microsecond=0) - today_date).days
             
-            tag_name = f"task_{task['id']}"
+            # 色分け判定用（時刻追加前）
+            is_today = (days_diff == 0)
+            is_tomorrow = (days_diff == 1)
             
-            if is_today:
-                tag_name = f"{tag_name}_today"
-            elif is_tomorrow or is_high_priority:
-                tag_name = f"{tag_name}_yellow"
+            if days_diff < 0:
+                deadline_display = deadline_dt.strftime('%m/%d')
+            elif days_diff == 0:
+                deadline_display = "本日"
+            elif days_diff == 1:
+                deadline_display = "明日"
+            else:
+                deadline_display = deadline_dt.strftime('%m/%d')
             
-            values = ('☐', task_id, task['name'], deadline_display, priority_display, '...')
-            item_id = self.tree.insert('', tk.END, values=values, tags=(str(task['id']), tag_name))
+            # 時刻を追加表示
+            if has_time and deadline_dt.strftime('%H:%M') != '23:59':
+                deadline_display += f" {deadline_dt.strftime('%H:%M')}"
+        except:
+            deadline_display = deadline
+            is_today = False
+            is_tomorrow = False
+        
+        priority_display = PRIORITY_LABELS.get(task['priority'], '中')
+        
+        is_high_priority = task['priority'] == 3
+        
+        tag_name = f"task_{task['id']}"
+        background = None
+        
+        if is_today:
+            tag_name = f"{tag_name}_today"
+            background = '#ffcccc'
+        elif is_tomorrow or is_high_priority:
+            tag_name = f"{tag_name}_yellow"
+            background = '#ffffcc'
+        
+        name = task['name']
+        if not task['completed'] and self.manager.graph.is_blocked(task['id']):
+            # 先行タスクが終わっていない
+            name = f"[待ち] {name}"
+        
+        values = ('☐', task_id, name, deadline_display, priority_display, '...')
+        return values, (str(task['id']), tag_name), background, deadline_date
+    
+    def insert_task_row(self, task, index=tk.END, parent_id=None):
+        values, tags, background, deadline_date = self.task_row_style(task)
+        parent_item = self.task_items.get(parent_id, '')
+        item_id = self.tree.insert(parent_item, index, values=values, tags=tags, open=True)
+        
+        if background:
+            self.tree.tag_configure(tags[1], background=background, foreground='black')
+        
+        self.task_items[task['id']] = item_id
+        if deadline_date is not None:
+            self.day_rows[deadline_date].add(task['id'])
+        return item_id
+    
+    def restyle_task_row(self, item, task):
+        """既存の行の表示と色だけを更新（選択状態は維持）"""
+        values, tags, background, _ = self.task_row_style(task)
+        if item in self.selected_tasks:
+            values = ('☑',) + values[1:]
+        self.tree.item(item, values=values, tags=tags)
+        if background:
+            self.tree.tag_configure(tags[1], background=background, foreground='black')
+    
+    def schedule_deadline_refresh(self):
+        """次に期限を迎えるタスクの時刻にコールバックを予約"""
+        if self.deadline_job is not None:
+            self.root.after_cancel(self.deadline_job)
+            self.deadline_job = None
+        if not self.deadline_heap:
+            return
+        
+        delay = (self.deadline_heap[0][0] - datetime.now()).total_seconds()
+        # 遠い期限は1時間ごとに予約し直す（after の待ち時間を大きくしすぎない）
+        delay_ms = max(0, min(int(delay * 1000) + 1, 3600 * 1000))
+        self.deadline_job = self.root.after(delay_ms, self.on_deadline_crossed)
+    
+    def on_deadline_crossed(self):
+        """期限を迎えたタスクの行だけを移動"""
+        self.deadline_job = None
+        now = datetime.now()
+        
+        while self.deadline_heap and self.deadline_heap[0][0] <= now:
+            _, task_id = heapq.heappop(self.deadline_heap)
             
-            if is_today:
-                self.tree.tag_configure(tag_name, background='#ffcccc', foreground='black')
-            elif is_tomorrow or is_high_priority:
-                self.tree.tag_configure(tag_name, background='#ffffcc', foreground='black')
+            if self.view_mode == 'active':
+                # 通常表示から取り除く
+                item = self.task_items.pop(task_id, None)
+                if item is not None:
+                    # サブタスクの行は残して親の位置に繰り上げる
+                    parent_item = self.tree.parent(item)
+                    position = self.tree.index(item)
+                    for child in reversed(self.tree.get_children(item)):
+                        self.tree.move(child, parent_item, position)
+                    self.selected_tasks.discard(item)
+                    self.tree.delete(item)
+                if self.pending_rows:
+                    # 挿入待ちの行からも外す（子の親IDは並べ直した結果に合わせる）
+                    rows, _ = self.visible_rows()
+                    pending_ids = {task['id'] for task, _ in self.pending_rows}
+                    self.pending_rows = [row for row in rows if row[0]['id'] in pending_ids]
+            elif self.view_mode == 'expired':
+                # 期限切れ表示に加える
+                task = self.manager.get_task(task_id)
+                if task and not task['completed'] and task_id not in self.task_items:
+                    self.insert_crossed_row(task_id)
+        
+        self.schedule_deadline_refresh()
+    
+    def insert_crossed_row(self, task_id):
+        """期限を迎えたタスクの行を、一覧を読み込み直した時と同じ位置に挿入"""
+        rows, _ = self.visible_rows()
+        position = next((i for i, (task, _) in enumerate(rows) if task['id'] == task_id), None)
+        if position is None:
+            return
+        
+        if self.pending_rows:
+            pending_ids = {task['id'] for task, _ in self.pending_rows}
+            if any(task['id'] in pending_ids for task, _ in rows[:position]):
+                # まだ挿入していない範囲に入るので、挿入待ちの行に加える
+                pending_ids.add(task_id)
+                self.pending_rows = [row for row in rows if row[0]['id'] in pending_ids]
+                return
+        
+        task, parent_id = rows[position]
+        # 同じ親の下で、後ろに来る既存の行の前に入れる
+        index = tk.END
+        for later, later_parent in rows[position + 1:]:
+            if later_parent == parent_id and later['id'] in self.task_items:
+                index = self.tree.index(self.task_items[later['id']])
+                break
+        item = self.insert_task_row(task, index, parent_id)
+        
+        # 親がなく最上位に出ていたサブタスクを新しい行の下に移す
+        for child, child_parent in rows[position + 1:]:
+            if child_parent == task_id and child['id'] in self.task_items:
+                self.tree.move(self.task_items[child['id']], item, tk.END)
+        if self.pending_rows:
+            pending_ids = {task['id'] for task, _ in self.pending_rows}
+            self.pending_rows = [row for row in rows if row[0]['id'] in pending_ids]
+    
+    def schedule_midnight_refresh(self):
+        """日付が変わる時刻にコールバックを予約"""
+        if self.midnight_job is not None:
+            self.root.after_cancel(self.midnight_job)
+        now = datetime.now()
+        next_midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        delay_ms = int((next_midnight - now).total_seconds() * 1000) + 1
+        self.midnight_job = self.root.after(delay_ms, self.on_midnight)
+    
+    def on_midnight(self):
+        """「本日」「明日」の表示と色が変わる行だけを更新"""
+        self.midnight_job = None
+        today = datetime.now().date()
+        
+        for day in (today - timedelta(days=1), today, today + timedelta(days=1)):
+            for task_id in list(self.day_rows.get(day, ())):
+                item = self.task_items.get(task_id)
+                task = self.manager.get_task(task_id)
+                if item is None or task is None:
+                    continue
+                self.restyle_task_row(item, task)
+        
+        self.schedule_midnight_refresh()
     
     def update_tree_display(self):
-        for item in self.tree.get_children():
+        for item in self.task_items.values():
             values = list(self.tree.item(item)['values'])
             
             if item in self.selected_tasks:
@@ -280,111 +836,43 @@ class TaskManagerGUI:
             
             self.tree.item(item, values=values)
     
+    def get_task_editor(self):
+        """追加・編集ダイアログを1度だけ構築（通常は起動後のアイドル時に構築済み）"""
+        if self.task_editor is None:
+            self.task_editor = TaskEditorDialog(self)
+        return self.task_editor
+    
     def add_task_dialog(self):
-        dialog = tk.Toplevel(self.root)
-        dialog.title("タスク追加")
-        dialog.geometry("400x300")
-        dialog.transient(self.root)
-        dialog.grab_set()
-        
-        frame = tk.Frame(dialog, bg='#d3d3d3')
-        frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-        
-        tk.Label(frame, text="タスク名", bg='#d3d3d3', font=("Arial", 10)).grid(row=0, column=0, sticky='w', pady=10)
-        name_entry = tk.Entry(frame, width=30, bg='white', fg='black', font=("Arial", 10))
-        name_entry.grid(row=0, column=1, pady=10, padx=10)
-        
-        tk.Label(frame, text="期限日", bg='#d3d3d3', font=("Arial", 10)).grid(row=1, column=0, sticky='w', pady=10)
-        deadline_frame = tk.Frame(frame, bg='#d3d3d3')
-        deadline_frame.grid(row=1, column=1, pady=10, padx=10, sticky='w')
-        deadline_var = tk.StringVar(value=datetime.now().strftime('%Y-%m-%d'))
-        deadline_entry = tk.Entry(deadline_frame, textvariable=deadline_var, width=23, bg='white', fg='black', font=("Arial", 10), state='readonly')
-        deadline_entry.pack(side=tk.LEFT)
-        
-        def open_calendar():
-            cal_window = tk.Toplevel(dialog)
-            cal_window.title("期限を選択")
-            cal_window.geometry("300x300")
-            cal_window.transient(dialog)
-            cal_window.grab_set()
-            
-            cal = Calendar(cal_window, selectmode='day', date_pattern='yyyy-mm-dd',
-                          year=datetime.now().year, month=datetime.now().month, day=datetime.now().day,
-                          background='white', foreground='black',
-                          headersbackground='#1e5a7d', headersforeground='white',
-                          selectbackground='#4a90d9', selectforeground='white',
-                          normalbackground='white', normalforeground='black',
-                          weekendbackground='#f0f0f0', weekendforeground='black')
-            cal.pack(pady=20, padx=20)
-            
-            def select_date():
-                deadline_var.set(cal.get_date())
-                cal_window.destroy()
-            
-            tk.Button(cal_window, text="選択", command=select_date, font=("Arial", 10), width=10).pack(pady=10)
-        
-        cal_button = tk.Button(deadline_frame, text="📅", command=open_calendar,
-                              bg='#1e5a7d', fg='white', font=("Arial", 10, "bold"), width=3)
-        cal_button.pack(side=tk.LEFT, padx=2)
-        
-        tk.Label(frame, text="時刻", bg='#d3d3d3', font=("Arial", 10)).grid(row=2, column=0, sticky='w', pady=10)
-        time_frame = tk.Frame(frame, bg='#d3d3d3')
-        time_frame.grid(row=2, column=1, pady=10, padx=10, sticky='w')
-        time_var = tk.StringVar(value="23:59")
-        time_values = [f"{h:02d}:00" for h in range(1, 24)] + ["23:59"]
-        time_combo = ttk.Combobox(time_frame, textvariable=time_var,
-                                 values=time_values,
-                                 width=23, state='readonly')
-        time_combo.pack(side=tk.LEFT)
-        
-        tk.Label(frame, text="優先度", bg='#d3d3d3', font=("Arial", 10)).grid(row=3, column=0, sticky='w', pady=10)
-        priority_frame = tk.Frame(frame, bg='#d3d3d3')
-        priority_frame.grid(row=3, column=1, pady=10, padx=10, sticky='w')
-        priority_var = tk.StringVar(value="中")
-        priority_combo = ttk.Combobox(priority_frame, textvariable=priority_var, 
-                                     values=['低', '中', '高'], 
-                                     width=23, state='readonly')
-        priority_combo.pack(side=tk.LEFT)
-        
-        button_frame = tk.Frame(frame, bg='#d3d3d3')
-        button_frame.grid(row=4, column=0, columnspan=2, pady=20)
-        
-        def on_add():
-            name = name_entry.get().strip()
-            deadline = deadline_var.get().strip()
-            deadline_time = time_var.get().strip()
-            priority_text = priority_var.get()
-            
-            priority_map = {'低': 1, '中': 2, '高': 3}
-            priority = priority_map.get(priority_text, 2)
-            
-            if not name or not deadline:
-                messagebox.showwarning("入力エラー", "タスク名と期限を入力してください")
-                return
-            
-            self.manager.add_task(name, deadline, priority, deadline_time)
-            self.load_task_list()
-            dialog.destroy()
+        self.get_task_editor().open_add()
+    
+    def quick_add_task(self, event=None):
+        """クイック追加欄の入力からダイアログなしでタスクを追加"""
+        text = self.quick_add_var.get().strip()
+        if not text:
+            return
         
-        add_btn = tk.Button(button_frame, text="追加する", command=on_add,
-                           font=("Arial", 10), width=12)
-        add_btn.pack(side=tk.LEFT, padx=10)
+        name, deadline, deadline_time, priority = parse_quick_add(text)
+        if not name:
+            messagebox.showwarning("入力エラー", "タスク名を入力してください")
+            return
         
-        cancel_btn = tk.Button(button_frame, text="キャンセル", command=dialog.destroy,
-                              font=("Arial", 10), width=12)
-        cancel_btn.pack(side=tk.LEFT, padx=10)
+        self.manager.add_task(name, deadline, priority, deadline_time)
+        self.quick_add_var.set('')
+        self.load_task_list()
     
     def complete_selected_tasks(self):
         if not self.selected_tasks:
             messagebox.showinfo("情報", "タスクを選択してください")
             return
         
-        for item in self.selected_tasks:
-            task_id = int(self.tree.item(item)['tags'][0])
-            self.manager.complete_task(task_id)
-            # 通知済みリストから削除
-            if task_id in self.notified_tasks:
-                del self.notified_tasks[task_id]
+        # 一括操作は1回の保存・1件の履歴にまとめる
+        with self.manager.batch():
+            for item in self.selected_tasks:
+                task_id = int(self.tree.item(item)['tags'][0])
+                self.manager.complete_task(task_id)
+                # 通知済みリストから削除
+                self.notification_ledger.discard(task_id)
+        self.notification_ledger.save()
         
         self.load_task_list()
         messagebox.showinfo("完了", "選択したタスクを完了にしました")
@@ -396,20 +884,56 @@ class TaskManagerGUI:
         
         result = messagebox.askyesno("確認", "選択したタスクを削除しますか？")
         if result:
-            for item in self.selected_tasks:
-                task_id = int(self.tree.item(item)['tags'][0])
-                self.manager.delete_task(task_id)
-                # 通知済みリストから削除
-                if task_id in self.notified_tasks:
-                    del self.notified_tasks[task_id]
+            with self.manager.batch():
+                for item in self.selected_tasks:
+                    task_id = int(self.tree.item(item)['tags'][0])
+                    self.manager.delete_task(task_id)
+                    # 通知済みリストから削除
+                    self.notification_ledger.discard(task_id)
+            self.notification_ledger.save()
             
             self.load_task_list()
             messagebox.showinfo("削除", "選択したタスクを削除しました")
     
+    def undo_last_action(self, event=None):
+        if isinstance(self.manager, MappedTaskStore):
+            messagebox.showinfo("元に戻す", "この保存形式では元に戻す操作に対応していません")
+            return
+        try:
+            self.apply_history(self.manager.undo())
+        except ValueError as e:
+            messagebox.showwarning("元に戻す", str(e))
+    
+    def redo_last_action(self, event=None):
+        if isinstance(self.manager, MappedTaskStore):
+            messagebox.showinfo("やり直し", "この保存形式ではやり直しに対応していません")
+            return
+        try:
+            self.apply_history(self.manager.redo())
+        except ValueError as e:
+            messagebox.showwarning("やり直し", str(e))
+    
+    def apply_history(self, entry):
+        """元に戻した/やり直した操作を一覧に反映する"""
+        if entry is None:
+            return
+        # 期限が変わったタスクと、追加・削除されたタスクだけ通知済みフラグをやり直す
+        for delta in entry:
+            if delta[0] in ('add', 'delete'):
+                self.notification_ledger.discard(delta[1]['id'])
+            elif 'deadline' in delta[2]:
+                self.notification_ledger.discard(delta[1])
+        self.notification_ledger.save()
+        self.load_task_list()
+    
     def show_active_tasks(self):
         self.view_mode = 'active'
         self.load_task_list()
     
+    def show_next_tasks(self):
+        self.view_mode = 'next'
+        self.load_task_list()
+    
     def show_completed_tasks(self):
         self.view_mode = 'completed'
         self.load_task_list()
@@ -418,126 +942,41 @@ class TaskManagerGUI:
         self.view_mode = 'expired'
         self.load_task_list()
     
+    def show_summary_panel(self):
+        """完了率・期限切れ・締め切りの集中をまとめたパネルを表示"""
+        try:
+            # numpyは集計を開いた時だけ読み込む
+            import task_report
+            report = task_report.build_report(self.manager)
+        except RuntimeError as e:
+            messagebox.showerror("集計", str(e))
+            return
+        
+        if self.summary_window is None:
+            self.summary_window = tk.Toplevel(self.root)
+            self.summary_window.title("集計")
+            self.summary_window.geometry("520x600")
+            self.summary_window.protocol("WM_DELETE_WINDOW", self.summary_window.withdraw)
+            self.summary_text = tk.Text(self.summary_window, font=("Courier", 11), wrap='none')
+            self.summary_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        self.summary_text.config(state='normal')
+        self.summary_text.delete('1.0', tk.END)
+        self.summary_text.insert('1.0', task_report.format_text(report))
+        self.summary_text.config(state='disabled')
+        self.summary_window.deiconify()
+        self.summary_window.lift()
+    
     def edit_task_from_menu(self):
         if not self.current_menu_item:
             return
         
         task_id = int(self.tree.item(self.current_menu_item)['tags'][0])
-        task = None
-        for t in self.manager.get_all_tasks():
-            if t['id'] == task_id:
-                task = t
-                break
-        
+        task = self.manager.get_task(task_id)
         if not task:
             return
         
-        # 現在の期限から日付と時刻を分離
-        if ' ' in task['deadline']:
-            current_date, current_time = task['deadline'].split(' ')
-        else:
-            current_date = task['deadline']
-            current_time = '23:59'
-        
-        dialog = tk.Toplevel(self.root)
-        dialog.title("タスク編集")
-        dialog.geometry("400x300")
-        dialog.transient(self.root)
-        dialog.grab_set()
-        
-        frame = tk.Frame(dialog, bg='#d3d3d3')
-        frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-        
-        tk.Label(frame, text="タスク名", bg='#d3d3d3', font=("Arial", 10)).grid(row=0, column=0, sticky='w', pady=10)
-        name_entry = tk.Entry(frame, width=30, bg='white', fg='black', font=("Arial", 10))
-        name_entry.insert(0, task['name'])
-        name_entry.grid(row=0, column=1, pady=10, padx=10)
-        
-        tk.Label(frame, text="期限日", bg='#d3d3d3', font=("Arial", 10)).grid(row=1, column=0, sticky='w', pady=10)
-        deadline_frame = tk.Frame(frame, bg='#d3d3d3')
-        deadline_frame.grid(row=1, column=1, pady=10, padx=10, sticky='w')
-        deadline_var = tk.StringVar(value=current_date)
-        deadline_entry = tk.Entry(deadline_frame, textvariable=deadline_var, width=23, bg='white', fg='black', font=("Arial", 10), state='readonly')
-        deadline_entry.pack(side=tk.LEFT)
-        
-        def open_calendar():
-            cal_window = tk.Toplevel(dialog)
-            cal_window.title("期限を選択")
-            cal_window.geometry("300x300")
-            cal_window.transient(dialog)
-            cal_window.grab_set()
-            
-            cal = Calendar(cal_window, selectmode='day', date_pattern='yyyy-mm-dd',
-                          year=datetime.now().year, month=datetime.now().month, day=datetime.now().day,
-                          background='white', foreground='black',
-                          headersbackground='#1e5a7d', headersforeground='white',
-                          selectbackground='#4a90d9', selectforeground='white',
-                          normalbackground='white', normalforeground='black',
-                          weekendbackground='#f0f0f0', weekendforeground='black')
-            cal.pack(pady=20, padx=20)
-            
-            def select_date():
-                deadline_var.set(cal.get_date())
-                cal_window.destroy()
-            
-            tk.Button(cal_window, text="選択", command=select_date, font=("Arial", 10), width=10).pack(pady=10)
-        
-        cal_button = tk.Button(deadline_frame, text="📅", command=open_calendar,
-                              bg='#1e5a7d', fg='white', font=("Arial", 10, "bold"), width=3)
-        cal_button.pack(side=tk.LEFT, padx=2)
-        
-        tk.Label(frame, text="時刻", bg='#d3d3d3', font=("Arial", 10)).grid(row=2, column=0, sticky='w', pady=10)
-        time_frame = tk.Frame(frame, bg='#d3d3d3')
-        time_frame.grid(row=2, column=1, pady=10, padx=10, sticky='w')
-        time_var = tk.StringVar(value=current_time)
-        time_values = [f"{h:02d}:00" for h in range(1, 24)] + ["23:59"]
-        time_combo = ttk.Combobox(time_frame, textvariable=time_var,
-                                 values=time_values,
-                                 width=23, state='readonly')
-        time_combo.pack(side=tk.LEFT)
-        
-        tk.Label(frame, text="優先度", bg='#d3d3d3', font=("Arial", 10)).grid(row=3, column=0, sticky='w', pady=10)
-        priority_frame = tk.Frame(frame, bg='#d3d3d3')
-        priority_frame.grid(row=3, column=1, pady=10, padx=10, sticky='w')
-        
-        priority_map = {1: '低', 2: '中', 3: '高'}
-        current_priority = priority_map.get(task['priority'], '中')
-        priority_var = tk.StringVar(value=current_priority)
-        priority_combo = ttk.Combobox(priority_frame, textvariable=priority_var, 
-                                     values=['低', '中', '高'], 
-                                     width=23, state='readonly')
-        priority_combo.pack(side=tk.LEFT)
-        
-        button_frame = tk.Frame(frame, bg='#d3d3d3')
-        button_frame.grid(row=4, column=0, columnspan=2, pady=20)
-        
-        def on_save():
-            name = name_entry.get().strip()
-            deadline = deadline_var.get().strip()
-            deadline_time = time_var.get().strip()
-            priority_text = priority_var.get()
-            
-            priority_map_reverse = {'低': 1, '中': 2, '高': 3}
-            priority = priority_map_reverse.get(priority_text, 2)
-            
-            if not name or not deadline:
-                messagebox.showwarning("入力エラー", "タスク名と期限を入力してください")
-                return
-            
-            task['name'] = name
-            task['deadline'] = f"{deadline} {deadline_time}"
-            task['priority'] = priority
-            self.manager.save_tasks()
-            self.load_task_list()
-            dialog.destroy()
-        
-        save_btn = tk.Button(button_frame, text="保存", command=on_save,
-                           font=("Arial", 10), width=12)
-        save_btn.pack(side=tk.LEFT, padx=10)
-        
-        cancel_btn = tk.Button(button_frame, text="キャンセル", command=dialog.destroy,
-                              font=("Arial", 10), width=12)
-        cancel_btn.pack(side=tk.LEFT, padx=10)
+        self.get_task_editor().open_edit(task)
     
     def complete_task_from_menu(self):
         if not self.current_menu_item:
@@ -546,11 +985,58 @@ class TaskManagerGUI:
         task_id = int(self.tree.item(self.current_menu_item)['tags'][0])
         self.manager.complete_task(task_id)
         # 通知済みリストから削除
-        if task_id in self.notified_tasks:
-            del self.notified_tasks[task_id]
+        self.notification_ledger.discard(task_id)
+        self.notification_ledger.save()
         self.load_task_list()
         messagebox.showinfo("完了", "タスクを完了にしました")
     
+    def ask_task_ids(self, title, prompt):
+        """カンマ区切りのタスク番号を入力させる（キャンセルはNone）"""
+        text = simpledialog.askstring(title, prompt, parent=self.root)
+        if text is None:
+            return None
+        try:
+            return [int(part) for part in text.replace('、', ',').split(',') if part.strip()]
+        except ValueError:
+            messagebox.showwarning("入力エラー", "番号を入力してください")
+            return None
+    
+    def set_parent_from_menu(self):
+        if not self.current_menu_item:
+            return
+        
+        task_id = int(self.tree.item(self.current_menu_item)['tags'][0])
+        ids = self.ask_task_ids("親タスクを設定", "親タスクの番号（空欄で解除）:")
+        if ids is None:
+            return
+        try:
+            found = self.manager.set_parent(task_id, ids[0] if ids else None)
+        except ValueError as e:
+            messagebox.showwarning("入力エラー", str(e))
+            return
+        if not found:
+            messagebox.showwarning("入力エラー", "タスクが見つかりません")
+            return
+        self.load_task_list()
+    
+    def set_blockers_from_menu(self):
+        if not self.current_menu_item:
+            return
+        
+        task_id = int(self.tree.item(self.current_menu_item)['tags'][0])
+        ids = self.ask_task_ids("先行タスクを設定", "先に終わらせるタスクの番号（カンマ区切り、空欄で解除）:")
+        if ids is None:
+            return
+        try:
+            found = self.manager.set_blockers(task_id, ids)
+        except ValueError as e:
+            messagebox.showwarning("入力エラー", str(e))
+            return
+        if not found:
+            messagebox.showwarning("入力エラー", "タスクが見つかりません")
+            return
+        self.load_task_list()
+    
     def delete_task_from_menu(self):
         if not self.current_menu_item:
             return
@@ -560,8 +1046,8 @@ class TaskManagerGUI:
             task_id = int(self.tree.item(self.current_menu_item)['tags'][0])
             self.manager.delete_task(task_id)
             # 通知済みリストから削除
-            if task_id in self.notified_tasks:
-                del self.notified_tasks[task_id]
+            self.notification_ledger.discard(task_id)
+            self.notification_ledger.save()
             self.load_task_list()
             messagebox.showinfo("削除", "タスクを削除しました")
     
@@ -618,37 +1104,10 @@ class TaskManagerGUI:
             message_parts.append(f"優先度高: {len(high_priority_tasks)}件")
         
         self.show_notification("学生タスク管理 - 重要なタスク", "\n".join(message_parts))
-        
-        # 通知メッセージを作成
-        message_parts = []
-        if today_tasks:
-            message_parts.append(f"本日締め切り: {len(today_tasks)}件")
-        if tomorrow_tasks:
-            message_parts.append(f"明日締め切り: {len(tomorrow_tasks)}件")
-        if high_priority_tasks:
-            message_parts.append(f"優先度高: {len(high_priority_tasks)}件")
-        
-        self.show_notification("学生タスク管理 - 重要なタスク", "\n".join(message_parts))
     
     def show_notification(self, title, message):
-        """Windows/Linux両対応の通知を表示"""
-        if platform.system() == 'Windows':
-            try:
-                from winotify import Notification, audio
-                toast = Notification(
-                    app_id="学生タスク管理",
-                    title=title,
-                    msg=message,
-                    duration="long"
-                )
-                toast.set_audio(audio.Default, loop=False)
-                toast.show()
-            except Exception as e:
-                # エラー時はメッセージボックスにフォールバック
-                self.root.after(0, lambda: messagebox.showinfo(title, message))
-        else:
-            # Linux等ではメッセージボックス
-            self.root.after(0, lambda: messagebox.showinfo(title, message))
+        """Windows/Linux両対応の通知をディスパッチャ経由で表示（呼び出し側はブロックしない）"""
+        self.notifier.notify(title, message)
     
     def start_periodic_check(self):
         """定期的にタスクをチェックして通知（バックグラウンドスレッド）"""
@@ -656,97 +1115,51 @@ class TaskManagerGUI:
             print("[定期チェック] 開始")
             
             while not self.is_closing:
-                # 現在時刻を取得
-                now = datetime.now()
-                
                 # 次の毎時00分まで待つ
-                next_check = now.replace(minute=0, second=0, microsecond=0)
-                if now.minute > 0 or now.second > 0:
-                    # 現在が00分を過ぎている場合は次の時間の00分
-                    next_check = next_check + timedelta(hours=1)
-                
-                wait_seconds = (next_check - now).total_seconds()
+                next_check = self.deadline_checker.next_check_time()
+                wait_seconds = (next_check - self.clock.now()).total_seconds()
                 print(f"[定期チェック] 次回チェック: {next_check.strftime('%Y-%m-%d %H:%M')} ({wait_seconds:.0f}秒後)")
                 
                 # 次のチェック時刻まで待機
-                time.sleep(wait_seconds)
+                self.clock.sleep(wait_seconds)
                 
                 if not self.is_closing:
-                    print(f"[定期チェック] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - 締め切りチェック実行")
+                    print(f"[定期チェック] {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')} - 締め切りチェック実行")
                     self.check_upcoming_deadlines()
         
         threading.Thread(target=check_loop, daemon=True).start()
     
     def check_upcoming_deadlines(self):
         """締め切りが近いタスクを通知（6時間、3時間、1時間前）"""
-        now = datetime.now()
-        active_tasks = self.manager.get_active_tasks()
-        print(f"[締め切りチェック] アクティブなタスク数: {len(active_tasks)}")
-        
-        # 各時間帯でチェック（時間、キー、ラベル）
-        time_windows = [
-            (6, '6h', '6時間'),
-            (3, '3h', '3時間'),
-            (1, '1h', '1時間')
-        ]
-        
-        for hours, key, label in time_windows:
-            tasks_to_alert = []
-            
-            for task in active_tasks:
-                task_id = task['id']
-                
-                # このタスクの通知状態を初期化
-                if task_id not in self.notified_tasks:
-                    self.notified_tasks[task_id] = {'6h': False, '3h': False, '1h': False}
-                
-                # すでにこの時間帯で通知済みならスキップ
-                if self.notified_tasks[task_id][key]:
-                    continue
-                
-                try:
-                    # 期限をdatetimeに変換（時刻は必須）
-                    deadline_dt = datetime.strptime(task['deadline'], '%Y-%m-%d %H:%M')
-                    
-                    # 締め切りまでの残り時間を計算
-                    time_remaining = deadline_dt - now
-                    hours_remaining = time_remaining.total_seconds() / 3600
-                    
-                    print(f"[締め切りチェック] タスク「{task['name']}」: 残り{hours_remaining:.2f}時間")
-                    
-                    # ちょうど指定時間前（1時間の範囲: hours-1 < 残り時間 <= hours）
-                    if hours - 1 < hours_remaining <= hours:
-                        tasks_to_alert.append(task)
-                        self.notified_tasks[task_id][key] = True
-                        print(f"[締め切りチェック] → {label}前通知対象に追加")
-                except Exception as e:
-                    print(f"[締め切りチェック] エラー: {e}")
-                    continue
-            
-            if tasks_to_alert:
-                # タスク名を列挙
-                task_names = '\n'.join([f"・{t['name']}" for t in tasks_to_alert[:5]])
-                if len(tasks_to_alert) > 5:
-                    task_names += f"\n...他{len(tasks_to_alert) - 5}件"
-                
-                print(f"[通知] {label}前: {len(tasks_to_alert)}件")
-                self.show_notification(
-                    f"締め切り{label}前",
-                    f"{len(tasks_to_alert)}件のタスクが{label}前です\n\n{task_names}"
-                )
+        return self.deadline_checker.check()
     
     def create_tray_image(self):
-        """システムトレイ用のアイコンを作成"""
+        """システムトレイ用のアイコンを取得（描画済みのキャッシュがあれば再利用）"""
+        from PIL import Image, ImageDraw
+        if os.path.exists(TRAY_ICON_CACHE):
+            try:
+                image = Image.open(TRAY_ICON_CACHE)
+                image.load()
+                return image
+            except OSError:
+                pass
+        
         # 簡単なアイコンを作成
         image = Image.new('RGB', (64, 64), color='white')
         dc = ImageDraw.Draw(image)
         dc.rectangle([16, 16, 48, 48], fill='#1e5a7d', outline='#1e5a7d')
         dc.rectangle([20, 20, 44, 28], fill='white')
         dc.rectangle([20, 32, 44, 40], fill='white')
+        try:
+            os.makedirs(os.path.dirname(TRAY_ICON_CACHE), exist_ok=True)
+            image.save(TRAY_ICON_CACHE)
+        except OSError:
+            pass
         return image
     
     def setup_tray_icon(self):
         """システムトレイアイコンをセットアップ"""
+        import pystray
         icon_image = self.create_tray_image()
         
         menu = pystray.Menu(
@@ -755,6 +1168,7 @@ class TaskManagerGUI:
         )
         
         self.tray_icon = pystray.Icon("task_manager", icon_image, "Task Manager", menu)
+        self.mark_startup("トレイアイコン")
         self.tray_icon.run()
     
     def show_window(self, icon=None, item=None):
@@ -773,6 +1187,7 @@ class TaskManagerGUI:
     def quit_app(self, icon=None, item=None):
         """アプリケーションを終了"""
         self.is_closing = True
+        self.notifier.stop()
         if self.tray_icon:
             self.tray_icon.stop()
         self.root.quit()
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+# iCalendar (RFC 5545) 形式で期限をカレンダーアプリ向けに書き出す。
+# 各タスクは1つのVEVENTで、UIDはタスクIDとタスクファイル名から作るので変わらない。
+# VEVENTには内容のハッシュ (X-UTM-HASH) を埋め込んでおき、次回はハッシュが
+# 変わったタスクだけを描き直す（ファイル自体が前回の状態を兼ねる）。
+DEADLINE_FORMAT = '%Y-%m-%d %H:%M'
+PRODID = '-//univ_taskmanager//学生タスク管理//JA'
+UID_DOMAIN = 'univ-taskmanager'
+# iCalendarのPRIORITYは1が最高、9が最低
+ICAL_HIGHEST, ICAL_LOWEST = 1, 9
+FOLD_OCTETS = 75
+
+def escape_text(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def fold_line(line):
+    """75オクテットを超える行を折り返す（UTF-8の文字の途中では切らない）"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= FOLD_OCTETS:
+        return line + '\r\n'
+    parts = []
+    current, size, limit = [], 0, FOLD_OCTETS
+    for ch in line:
+        n = len(ch.encode('utf-8'))
+        if size + n > limit:
+            parts.append(''.join(current))
+            # 継続行は先頭の空白1文字分だけ短くする
+            current, size, limit = [], 0, FOLD_OCTETS - 1
+        current.append(ch)
+        size += n
+    parts.append(''.join(current))
+    return '\r\n '.join(parts) + '\r\n'
+
+def ical_priority(priority, min_priority, max_priority):
+    """ストアの優先度（大きいほど高い）をiCalendarのPRIORITYに変換"""
+    priority = max(min_priority, min(max_priority, priority))
+    if max_priority == min_priority:
+        return ICAL_HIGHEST
+    span = ICAL_LOWEST - ICAL_HIGHEST
+    return ICAL_HIGHEST + round((max_priority - priority) * span / (max_priority - min_priority))
+
+def content_hash(task, priority):
+    """書き出す項目だけのハッシュ（完了済み・期限の解析できないタスクはNone）
+
+    priority は変換後のPRIORITYで、優先度の範囲が違う画面から書き出しても食い違わない。
+    """
+    if task.get('completed'):
+        return None
+    try:
+        datetime.strptime(task['deadline'], DEADLINE_FORMAT)
+    except (ValueError, TypeError):
+        return None
+    payload = json.dumps([task['name'], task['deadline'], priority], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def config_file(json_file):
+    """タスクファイルに対応する書き出し設定のパス"""
+    return f"{json_file}.ics.json"
+
+class IcsExporter:
+    """タスクの期限をiCalendarファイルに差分で書き出す
+
+    sync() に変更のあったタスクIDを渡すと、そのタスクのVEVENTだけを描き直し、
+    内容が変わった時だけファイルを書き換える。設定（書き出し先と自動書き出し）は
+    "<タスクファイル名>.ics.json" に保存する。
+    書き出し直後のタスクファイルの状態も設定に残し、開いた時にそれと一致すれば
+    全件の突き合わせを省く（既存のVEVENTも必要になるまで読まない）。
+    """
+
+    def __init__(self, json_file, ics_file=None, min_priority=1, max_priority=3):
+        self.json_file = json_file
+        self.min_priority = min_priority
+        self.max_priority = max_priority
+        # 設定と既定の書き出し先は拡張子だけ違うタスクファイルと共有しないようファイル名全体から作る
+        self.config_file = config_file(json_file)
+        self.store_key = os.path.basename(os.path.splitext(json_file)[0])
+        config = self.load_config()
+        self.ics_file = ics_file or config.get('ics_file') or f"{json_file}.ics"
+        self.auto = config.get('auto', False) and self.ics_file == config.get('ics_file')
+        self.calendar_name = config.get('calendar_name', '学生タスク')
+        # 最後に書き出した時のタスクファイルの状態と優先度の範囲
+        self.synced = config.get('synced')
+        self.events = None  # {task_id: (ハッシュ, SEQUENCE, VEVENTの文字列)}
+
+    def load_config(self):
+        if not os.path.exists(self.config_file):
+            return {}
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"iCalendar設定の読み込みエラー: {e}")
+            return {}
+
+    def save_config(self):
+        config = {'ics_file': self.ics_file, 'auto': self.auto, 'calendar_name': self.calendar_name,
+                  'synced': self.synced}
+        tmp_file = f"{self.config_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.config_file)
+
+    def set_auto(self, auto):
+        """コミットごとの自動書き出しを切り替える"""
+        self.auto = auto
+        self.save_config()
+
+    def sync_state(self):
+        """タスクファイルの状態（サイズと更新時刻）と優先度の範囲（ファイルが無ければNone）"""
+        try:
+            stat = os.stat(self.json_file)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns, self.min_priority, self.max_priority]
+
+    def is_current(self):
+        """前回の書き出し以降、タスクファイルが変わっていないか"""
+        state = self.sync_state()
+        return state is not None and state == self.synced and os.path.exists(self.ics_file)
+
+    def load_events(self):
+        """前回書き出したファイルからVEVENTをそのまま取り込む"""
+        self.events = {}
+        if not os.path.exists(self.ics_file):
+            return
+        with open(self.ics_file, 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+
+        for chunk in content.split('BEGIN:VEVENT\r\n')[1:]:
+            end = chunk.find('END:VEVENT\r\n')
+            if end < 0:
+                continue
+            block = 'BEGIN:VEVENT\r\n' + chunk[:end] + 'END:VEVENT\r\n'
+            fields = {}
+            for line in chunk[:end].split('\r\n'):
+                key, _, value = line.partition(':')
+                if key in ('X-UTM-ID', 'X-UTM-HASH', 'SEQUENCE'):
+                    fields[key] = value
+            try:
+                task_id = int(fields['X-UTM-ID'])
+                self.events[task_id] = (fields['X-UTM-HASH'], int(fields['SEQUENCE']), block)
+            except (KeyError, ValueError):
+                # 手で編集された等で読めないVEVENTは次回描き直す
+                continue
+
+    def priority_of(self, task):
+        return ical_priority(task['priority'], self.min_priority, self.max_priority)
+
+    def render_event(self, task, digest, sequence, stamp):
+        deadline = datetime.strptime(task['deadline'], DEADLINE_FORMAT)
+        priority = self.priority_of(task)
+        lines = [
+            'BEGIN:VEVENT',
+            f"UID:task-{task['id']}.{self.store_key}@{UID_DOMAIN}",
+            f"DTSTAMP:{stamp}",
+            f"SEQUENCE:{sequence}",
+            # 期限は時刻のみ（浮動時刻）。DTENDを省くと開始と同時刻に終わる予定になる
+            f"DTSTART:{deadline.strftime('%Y%m%dT%H%M%S')}",
+            f"SUMMARY:{escape_text(task['name'])}",
+            f"PRIORITY:{priority}",
+            'TRANSP:TRANSPARENT',
+            f"X-UTM-ID:{task['id']}",
+            f"X-UTM-HASH:{digest}",
+            'END:VEVENT',
+        ]
+        return ''.join(fold_line(line) for line in lines)
+
+    def sync(self, tasks, changed_ids=None):
+        """tasks（{task_id: タスク}）のうち changed_ids の分を反映し、変わったVEVENTの数を返す
+
+        changed_ids がNoneなら全件を突き合わせる。
+        """
+        if self.events is None:
+            self.load_events()
+        if changed_ids is None:
+            changed_ids = set(tasks) | set(self.events)
+
+        stamp = None
+        changed = 0
+        for task_id in changed_ids:
+            task = tasks.get(task_id)
+            digest = content_hash(task, self.priority_of(task)) if task is not None else None
+            current = self.events.get(task_id)
+            if digest is None:
+                # 削除・完了したタスクはカレンダーから外す
+                if current is not None:
+                    del self.events[task_id]
+                    changed += 1
+                continue
+            if current is not None and current[0] == digest:
+                continue
+            if stamp is None:
+                stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+            sequence = current[1] + 1 if current is not None else 0
+            self.events[task_id] = (digest, sequence, self.render_event(task, digest, sequence, stamp))
+            changed += 1
+
+        if changed or not os.path.exists(self.ics_file):
+            self.write()
+        state = self.sync_state()
+        if state != self.synced:
+            self.synced = state
+            self.save_config()
+        return changed
+
+    def write(self):
+        header = ''.join(fold_line(line) for line in (
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            f"PRODID:{PRODID}",
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f"X-WR-CALNAME:{escape_text(self.calendar_name)}",
+        ))
+        body = ''.join(event[2] for event in self.events.values())
+
+        tmp_file = f"{self.ics_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+            f.write(header + body + 'END:VCALENDAR\r\n')
+        os.replace(tmp_file, self.ics_file)
+
+def open_auto_exporter(json_file, min_priority=1, max_priority=3):
+    """自動書き出しが有効なら書き出し器を返す（無効ならNone）"""
+    if not os.path.exists(config_file(json_file)):
+        return None
+    exporter = IcsExporter(json_file, min_priority=min_priority, max_priority=max_priority)
+    return exporter if exporter.auto else None
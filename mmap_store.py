@@ -0,0 +1,342 @@
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from task_manager import TaskSnapshot
+from task_graph import TaskGraph
+from task_storage import CORE_KEYS
+
+# メモリマップ形式のタスクファイル
+#   ヘッダ(64バイト): magic(4) version(u16) record_size(u16) 件数(u32) 容量(u32) next_id(u32)
+#   レコード(32バイト固定): id(u32) 期限epoch秒(i64) 優先度(u8) 状態(u8) 名前位置(u64) 名前長(u32)
+# タスク名は "<ファイル名>.names" に追記専用で格納する。
+# IDは1から連番で、レコード位置 = id - 1（削除済みは状態フラグで表す）なので
+# get_task() はファイル全体を読まずに O(1) で参照できる。
+MAGIC = b'UTMM'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIII')
+HEADER_SIZE = 64
+RECORD = struct.Struct('<IqBB2xQI4x')
+
+STATUS_COMPLETED = 0x01
+STATUS_DELETED = 0x02
+
+NO_DEADLINE = -(1 << 63)
+DEADLINE_FORMAT = '%Y-%m-%d %H:%M'
+
+def is_mapped_store(path):
+    if not os.path.exists(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def deadline_to_epoch(deadline):
+    for fmt in (DEADLINE_FORMAT, '%Y-%m-%d'):
+        try:
+            dt = datetime.strptime(deadline, fmt)
+        except (ValueError, TypeError):
+            continue
+        if fmt == '%Y-%m-%d':
+            dt = dt.replace(hour=23, minute=59)
+        return int(dt.timestamp())
+    return NO_DEADLINE
+
+def epoch_to_deadline(epoch):
+    if epoch == NO_DEADLINE:
+        return ''
+    return datetime.fromtimestamp(epoch).strftime(DEADLINE_FORMAT)
+
+class MappedTaskStore:
+    """固定長レコードをメモリマップで扱うタスクストア
+
+    TaskManagerと同じ操作を提供するが、開く時にファイル全体を読み込まない。
+    完了フラグの更新はレコード内の1バイトを書き換えるだけで、ファイルを書き直さない。
+    id/name/deadline/priority/completed 以外の項目は保持しない。
+    """
+    MIN_PRIORITY = 1
+    MAX_PRIORITY = 3
+
+    def __init__(self, json_file='student_tasks.json'):
+        self.json_file = json_file
+        self.names_file = f"{json_file}.names"
+        self.write_lock = threading.RLock()
+        self.version = 0
+        self._snapshot = None
+        self._graph = None
+        self._graph_version = -1
+
+        if not os.path.exists(json_file):
+            self.create(json_file, {'tasks': [], 'next_id': 1})
+
+        self.file = open(json_file, 'r+b')
+        self.names = open(self.names_file, 'a+b')
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        magic, version, record_size, self.count, self.capacity, self.next_id = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError("メモリマップ形式のタスクファイルではありません")
+        if version != VERSION:
+            raise ValueError(f"未対応のタスクファイルのバージョンです: {version}")
+
+    @staticmethod
+    def create(path, document, force=False):
+        """ドキュメントからメモリマップ形式のファイルを作成（IDの欠番は削除済みレコードで埋める）
+
+        この形式で保持できない内容（追加の項目・解析できない期限）がある場合は
+        ValueErrorで中止する。force=Trueなら破棄して作成する。
+        """
+        tasks = {t['id']: t for t in document['tasks']}
+        next_id = document['next_id']
+        count = next_id - 1
+        capacity = max(64, count)
+
+        # 既存のメモリマップ形式を置き換える時は、名前の領域を引き継いで後ろに追記する。
+        # 名前を先に置き換えても、古いレコードが指す位置の内容は変わらない
+        names_file = f"{path}.names"
+        names = bytearray()
+        if is_mapped_store(path) and os.path.exists(names_file):
+            with open(names_file, 'rb') as f:
+                names += f.read()
+
+        lost_keys = {k for k in document if k not in ('tasks', 'next_id')}
+        bad_deadlines = 0
+        records = bytearray(capacity * RECORD.size)
+        for task_id in range(1, next_id):
+            task = tasks.get(task_id)
+            if task is None:
+                RECORD.pack_into(records, (task_id - 1) * RECORD.size, task_id, NO_DEADLINE, 0, STATUS_DELETED, 0, 0)
+                continue
+            lost_keys.update(k for k, v in task.items() if k not in CORE_KEYS and v not in (None, [], ''))
+            epoch = deadline_to_epoch(task['deadline'])
+            if epoch == NO_DEADLINE and task['deadline']:
+                bad_deadlines += 1
+            encoded = task['name'].encode('utf-8')
+            status = STATUS_COMPLETED if task['completed'] else 0
+            RECORD.pack_into(records, (task_id - 1) * RECORD.size, task_id,
+                             epoch, task['priority'], status,
+                             len(names), len(encoded))
+            names += encoded
+
+        if not force and (lost_keys or bad_deadlines):
+            problems = []
+            if lost_keys:
+                problems.append(f"項目 {', '.join(sorted(lost_keys))}")
+            if bad_deadlines:
+                problems.append(f"解析できない期限 {bad_deadlines}件")
+            raise ValueError(f"メモリマップ形式では保持できない内容があります（{'、'.join(problems)}）。"
+                             "破棄して変換するには --force を指定してください")
+
+        header = bytearray(HEADER_SIZE)
+        HEADER.pack_into(header, 0, MAGIC, VERSION, RECORD.size, count, capacity, next_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(records)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp_names = f"{names_file}.tmp"
+        with open(tmp_names, 'wb') as f:
+            f.write(names)
+            f.flush()
+            os.fsync(f.fileno())
+        # 名前 → レコードの順に置き換えれば、途中で落ちてもレコードが名前の外を指さない
+        os.replace(tmp_names, names_file)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        self.file.close()
+        self.names.close()
+
+    def _flush(self, offset, size):
+        # flushのoffsetはページ境界に揃える必要がある
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        self.mm.flush(start, offset + size - start)
+
+    def _write_header(self):
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, RECORD.size, self.count, self.capacity, self.next_id)
+        self._flush(0, HEADER.size)
+
+    def _record_offset(self, task_id):
+        if task_id < 1 or task_id > self.count:
+            return None
+        return HEADER_SIZE + (task_id - 1) * RECORD.size
+
+    def _read_name(self, offset, length):
+        # ファイル位置を共有するので読み込みもロックする
+        with self.write_lock:
+            self.names.seek(offset)
+            return self.names.read(length).decode('utf-8')
+
+    def _append_name(self, name):
+        encoded = name.encode('utf-8')
+        self.names.seek(0, os.SEEK_END)
+        offset = self.names.tell()
+        self.names.write(encoded)
+        self.names.flush()
+        return offset, len(encoded)
+
+    def _grow(self):
+        self.capacity = max(64, self.capacity * 2)
+        self.mm.close()
+        self.file.truncate(HEADER_SIZE + self.capacity * RECORD.size)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+    def _to_task(self, record):
+        task_id, epoch, priority, status, name_offset, name_length = record
+        return {
+            'id': task_id,
+            'name': self._read_name(name_offset, name_length),
+            'deadline': epoch_to_deadline(epoch),
+            'priority': priority,
+            'completed': bool(status & STATUS_COMPLETED)
+        }
+
+    def _changed(self):
+        self.version += 1
+
+    def iter_records(self):
+        """レコード領域だけを走査（タスク名は読まない）"""
+        end = HEADER_SIZE + self.count * RECORD.size
+        for record in RECORD.iter_unpack(self.mm[HEADER_SIZE:end]):
+            if not record[3] & STATUS_DELETED:
+                yield record
+
+    def find_ids(self, active_only=True, due_before=None):
+        """条件に合うタスクIDを固定長フィールドだけで絞り込む"""
+        ids = []
+        for task_id, epoch, _, status, _, _ in self.iter_records():
+            if active_only and status & STATUS_COMPLETED:
+                continue
+            if due_before is not None and (epoch == NO_DEADLINE or epoch >= due_before):
+                continue
+            ids.append(task_id)
+        return ids
+
+    def get_task(self, task_id: int):
+        offset = self._record_offset(task_id)
+        if offset is None:
+            return None
+        record = RECORD.unpack_from(self.mm, offset)
+        if record[3] & STATUS_DELETED:
+            return None
+        return self._to_task(record)
+
+    def add_task(self, name: str, deadline: str, priority: int = 2, deadline_time: str = '23:59'):
+        if priority < self.MIN_PRIORITY or priority > self.MAX_PRIORITY:
+            priority = max(self.MIN_PRIORITY, min(self.MAX_PRIORITY, priority))
+
+        # 日付と時刻を結合
+        if ' ' not in deadline:  # 時刻が含まれていない場合
+            deadline = f"{deadline} {deadline_time}"
+
+        with self.write_lock:
+            if self.count == self.capacity:
+                self._grow()
+            task_id = self.next_id
+            name_offset, name_length = self._append_name(name)
+            offset = HEADER_SIZE + self.count * RECORD.size
+            RECORD.pack_into(self.mm, offset, task_id, deadline_to_epoch(deadline), priority, 0,
+                             name_offset, name_length)
+            self._flush(offset, RECORD.size)
+            self.count += 1
+            self.next_id += 1
+            self._write_header()
+            self._changed()
+        return self.get_task(task_id)
+
+    def _set_status(self, task_id, flag):
+        with self.write_lock:
+            offset = self._record_offset(task_id)
+            if offset is None:
+                return False
+            status_offset = offset + 13  # id(4) + epoch(8) + priority(1)
+            status = self.mm[status_offset]
+            if status & (flag | STATUS_DELETED):
+                return False
+            self.mm[status_offset] = status | flag
+            self._flush(status_offset, 1)
+            self._changed()
+            return True
+
+    def complete_task(self, task_id: int) -> bool:
+        return self._set_status(task_id, STATUS_COMPLETED)
+
+    def delete_task(self, task_id: int) -> bool:
+        return self._set_status(task_id, STATUS_DELETED)
+
+    def update_task(self, task_id: int, name: str, deadline: str, priority: int) -> bool:
+        with self.write_lock:
+            offset = self._record_offset(task_id)
+            if offset is None:
+                return False
+            _, _, _, status, name_offset, name_length = RECORD.unpack_from(self.mm, offset)
+            if status & STATUS_DELETED:
+                return False
+            if self._read_name(name_offset, name_length) != name:
+                name_offset, name_length = self._append_name(name)
+            priority = max(self.MIN_PRIORITY, min(self.MAX_PRIORITY, priority))
+            RECORD.pack_into(self.mm, offset, task_id, deadline_to_epoch(deadline), priority, status,
+                             name_offset, name_length)
+            self._flush(offset, RECORD.size)
+            self._changed()
+            return True
+
+    def save_tasks(self):
+        self.mm.flush()
+
+    def batch(self):
+        """一括操作（各レコードはその場で書き込むのでロックを取るだけ）"""
+        return self.write_lock
+
+    def undo(self):
+        # 固定長レコード形式では元に戻す履歴を持たない
+        return None
+
+    def redo(self):
+        return None
+
+    @property
+    def graph(self) -> TaskGraph:
+        """親子・依存を持たないので、期限順の一覧としてだけ使う（変更があれば作り直す）"""
+        if self._graph_version != self.version:
+            with self.write_lock:
+                self._graph = TaskGraph(self.get_all_tasks())
+                self._graph_version = self.version
+        return self._graph
+
+    def set_parent(self, task_id: int, parent_id) -> bool:
+        raise ValueError("この保存形式ではサブタスクに対応していません")
+
+    def set_blockers(self, task_id: int, blocker_ids) -> bool:
+        raise ValueError("この保存形式では依存関係に対応していません")
+
+    def add_dependency(self, task_id: int, blocker_id: int) -> bool:
+        return self.set_blockers(task_id, [blocker_id])
+
+    def remove_dependency(self, task_id: int, blocker_id: int) -> bool:
+        return self.set_blockers(task_id, [])
+
+    def next_tasks(self, limit=None):
+        return [self.get_task(task_id) for task_id in self.graph.next_ids(limit)]
+
+    def get_active_tasks(self):
+        return [self._to_task(r) for r in self.iter_records() if not r[3] & STATUS_COMPLETED]
+
+    def get_all_tasks(self):
+        return [self._to_task(r) for r in self.iter_records()]
+
+    def to_document(self):
+        return {'tasks': self.get_all_tasks(), 'next_id': self.next_id}
+
+    def snapshot(self) -> TaskSnapshot:
+        """最新のスナップショットを返す（変更があった時だけ作り直す）"""
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != self.version:
+            with self.write_lock:
+                tasks = tuple(MappingProxyType(t) for t in self.get_all_tasks())
+                snapshot = TaskSnapshot(self.version, tasks, self.next_id)
+                self._snapshot = snapshot
+        return snapshot
@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+class MessageBoxSink:
+    """Tkのメッセージボックスで表示（Tkスレッドに委譲するのでブロックしない）"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def emit(self, title, message):
+        from tkinter import messagebox
+        self.root.after(0, lambda: messagebox.showinfo(title, message))
+
+class ToastSink:
+    """Windowsのトースト通知（winotify）。失敗時はfallbackに渡す"""
+
+    def __init__(self, app_id="学生タスク管理", fallback=None):
+        self.app_id = app_id
+        self.fallback = fallback
+
+    def emit(self, title, message):
+        try:
+            from winotify import Notification, audio
+            toast = Notification(
+                app_id=self.app_id,
+                title=title,
+                msg=message,
+                duration="long"
+            )
+            toast.set_audio(audio.Default, loop=False)
+            toast.show()
+        except Exception:
+            if self.fallback is None:
+                raise
+            self.fallback.emit(title, message)
+
+class LogFileSink:
+    """通知をテキストファイルに追記"""
+
+    def __init__(self, log_file='notifications.log'):
+        self.log_file = log_file
+
+    def emit(self, title, message):
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        body = message.replace('\n', ' / ')
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(f"{timestamp}\t{title}\t{body}\n")
+
+class MemorySink:
+    """受け取った通知をリストに溜めるだけの代替シンク（動作確認用）"""
+
+    def __init__(self):
+        self.delivered = []
+
+    def emit(self, title, message):
+        self.delivered.append((title, message))
+
+class NotificationDispatcher:
+    """通知を専用キューとワーカースレッドで配送する
+
+    同一内容の通知は重複排除し、coalesce_window秒以内に届いた通知は
+    1件のまとめ通知にし、配送間隔はmin_interval秒以上空ける。
+    notify()はキューに積むだけなので呼び出し側（チェッカー等）はブロックしない。
+    """
+
+    def __init__(self, sinks, coalesce_window=2.0, min_interval=10.0,
+                 dedupe_ttl=300.0, clock=time.monotonic):
+        self.sinks = list(sinks)
+        self.coalesce_window = coalesce_window
+        self.min_interval = min_interval
+        self.dedupe_ttl = dedupe_ttl
+        self.clock = clock
+        self.queue = queue.Queue()
+        self.recent = {}  # {(title, message): 最終配送時刻}
+        self.last_delivery = None
+        self.worker = None
+
+    def start(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+        return self
+
+    def stop(self):
+        if self.worker is not None:
+            self.queue.put(None)
+            self.worker.join(timeout=1.0)
+            self.worker = None
+
+    def notify(self, title, message):
+        self.queue.put((title, message))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            ready_at = self.clock() + self.coalesce_window
+            if self.last_delivery is not None:
+                ready_at = max(ready_at, self.last_delivery + self.min_interval)
+
+            # まとめ期間・レート制限の間に届いた通知を集める
+            stopping = False
+            while True:
+                remaining = ready_at - self.clock()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self.dispatch(batch)
+            if stopping:
+                return
+
+    def dispatch(self, batch):
+        """重複を除いてまとめた通知をシンクへ配送"""
+        now = self.clock()
+        self.recent = {k: t for k, t in self.recent.items() if now - t < self.dedupe_ttl}
+
+        unique = []
+        for item in batch:
+            if item in self.recent or item in unique:
+                continue
+            unique.append(item)
+        if not unique:
+            return
+
+        for item in unique:
+            self.recent[item] = now
+        self.last_delivery = now
+
+        if len(unique) == 1:
+            title, message = unique[0]
+        else:
+            title = f"学生タスク管理 - 通知{len(unique)}件"
+            message = "\n\n".join(f"【{t}】\n{m}" for t, m in unique)
+
+        for sink in self.sinks:
+            try:
+                sink.emit(title, message)
+            except Exception as e:
+                print(f"[通知] 配送エラー ({type(sink).__name__}): {e}")
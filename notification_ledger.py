@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+class NotificationLedger:
+    """締め切り通知の送信済みフラグをタスクデータの隣に永続化する台帳"""
+
+    # 通知の時間帯ごとのビットフラグ
+    FLAGS = {'6h': 1, '3h': 2, '1h': 4}
+
+    def __init__(self, json_file='student_tasks.json'):
+        self.ledger_file = f"{json_file}.notified.json"
+        self.flags = self.load()  # {task_id: int}
+        self.dirty = False
+        # チェッカースレッドとTkスレッドの両方から更新される
+        self.lock = threading.Lock()
+
+    def load(self):
+        if os.path.exists(self.ledger_file):
+            try:
+                with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                    return {int(k): int(v) for k, v in json.load(f).items()}
+            except (ValueError, OSError):
+                # 壊れた台帳は破棄（最悪でも通知が1回重複するだけ）
+                return {}
+        return {}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp_file = f"{self.ledger_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({str(k): v for k, v in self.flags.items()}, f, separators=(',', ':'))
+            os.replace(tmp_file, self.ledger_file)
+            self.dirty = False
+
+    def is_notified(self, task_id: int, key: str) -> bool:
+        return bool(self.flags.get(task_id, 0) & self.FLAGS[key])
+
+    def mark(self, task_id: int, key: str):
+        with self.lock:
+            flags = self.flags.get(task_id, 0) | self.FLAGS[key]
+            if flags != self.flags.get(task_id):
+                self.flags[task_id] = flags
+                self.dirty = True
+
+    def discard(self, task_id: int):
+        """完了・削除されたタスクのフラグを取り除く"""
+        with self.lock:
+            if self.flags.pop(task_id, None) is not None:
+                self.dirty = True
+
+    def prune(self, tasks, now=None):
+        """期限切れ・完了済み・存在しないタスクのエントリを削除"""
+        if not self.flags:
+            return
+        if now is None:
+            now = datetime.now()
+
+        upcoming_ids = set()
+        for task in tasks:
+            if task.get('completed', False) or task['id'] not in self.flags:
+                continue
+            try:
+                deadline_dt = datetime.strptime(task['deadline'], '%Y-%m-%d %H:%M')
+            except (ValueError, TypeError):
+                continue
+            if deadline_dt >= now:
+                upcoming_ids.add(task['id'])
+
+        with self.lock:
+            for task_id in list(self.flags):
+                if task_id not in upcoming_ids:
+                    del self.flags[task_id]
+                    self.dirty = True
+
+    def __len__(self):
+        return len(self.flags)
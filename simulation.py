@@ -0,0 +1,203 @@
+"""仮想時計で締め切り通知の流れを再生するシミュレーション
+
+数千件のタスクの追加・期限変更・完了・削除を数週間分、仮想時間で再生し、
+毎時のチェックを実時間を待たずに実行して以下を集計する。
+  - 1回のチェックあたりのCPU時間
+  - 6時間/3時間/1時間前の通知が本来の時刻からどれだけ遅れたか
+  - 重複した通知・漏れた通知
+  - ディスパッチャでまとめた後に実際に届く通知の件数
+
+使い方: python simulation.py [--tasks 3000] [--weeks 8] [--seed 0]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from clock import VirtualClock
+from deadline_checker import DeadlineChecker, TIME_WINDOWS
+from notification_dispatcher import NotificationDispatcher, MemorySink
+from notification_ledger import NotificationLedger
+from task_manager import TaskManager
+
+DEADLINE_FORMAT = '%Y-%m-%d %H:%M'
+
+def make_workload(start, weeks, task_count, rng):
+    """(時刻, 操作, 引数) の列を時刻順に作る"""
+    end = start + timedelta(weeks=weeks)
+    span = (end - start).total_seconds()
+    events = []
+    for n in range(task_count):
+        created = start + timedelta(minutes=int(rng.random() * span / 60))
+        deadline = created + timedelta(minutes=rng.randrange(60, 14 * 24 * 60))
+        deadline = deadline.replace(minute=rng.choice([0, 0, 0, 30, 59]))
+        events.append((created, 'add', n, deadline))
+
+        # 一部のタスクは期限を変更・完了・削除する
+        lifetime = (deadline - created).total_seconds()
+        roll = rng.random()
+        if roll < 0.15:
+            when = created + timedelta(seconds=rng.random() * lifetime)
+            new_deadline = deadline + timedelta(hours=rng.choice([-12, -3, 2, 24, 48]))
+            if new_deadline > when:
+                events.append((when, 'edit', n, new_deadline))
+        elif roll < 0.65:
+            events.append((created + timedelta(seconds=rng.random() * lifetime), 'complete', n, None))
+        elif roll < 0.70:
+            events.append((created + timedelta(seconds=rng.random() * lifetime), 'delete', n, None))
+    events.sort(key=lambda e: e[0])
+    return [e for e in events if e[0] < end], end
+
+def expected_alerts(history, last_check):
+    """本来届くべき通知の回数 {(task_id, key): 回数}
+
+    通知時刻がタスクの存在中（その期限が有効な間）に到来し、
+    直後の毎時チェックの時点でもまだ有効だったものを数える。
+    """
+    expected = Counter()
+    for task_id, h in history.items():
+        periods = h['deadlines']
+        for i, (since, deadline) in enumerate(periods):
+            until = periods[i + 1][0] if i + 1 < len(periods) else h['closed'] or (last_check + timedelta(seconds=1))
+            for hours, key, _ in TIME_WINDOWS:
+                due = deadline - timedelta(hours=hours)
+                check_at = due.replace(minute=0, second=0, microsecond=0)
+                if check_at < due:
+                    check_at += timedelta(hours=1)
+                if since <= due and check_at < until and check_at <= last_check:
+                    expected[(task_id, key)] += 1
+    return expected
+
+def run_simulation(task_count=3000, weeks=8, seed=0, start=None):
+    rng = random.Random(seed)
+    start = start or datetime(2025, 4, 7, 0, 0)
+    events, end = make_workload(start, weeks, task_count, rng)
+
+    clock = VirtualClock(start)
+    sink = MemorySink()
+    dispatcher = NotificationDispatcher([sink], clock=clock.monotonic)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'tasks.json')
+        manager = TaskManager(path, storage_format='binary')
+        ledger = NotificationLedger(path)
+
+        raw_alerts = []
+        checker = DeadlineChecker(manager, ledger, lambda t, m: raw_alerts.append((t, m)),
+                                  clock=clock, log=lambda message: None)
+
+        ids = {}  # {ワークロード上の番号: task_id}
+        history = {}  # {task_id: {'deadlines': [(時刻, 期限)], 'closed': 時刻}}
+        fired = []  # [(task_id, key, 通知時刻, 本来の時刻)]
+        pass_cpu = []
+
+        event_index = 0
+        last_check = start
+        while True:
+            next_check = checker.next_check_time()
+            if next_check >= end:
+                break
+            last_check = next_check
+
+            # 次のチェックまでの操作を再生
+            while event_index < len(events) and events[event_index][0] < next_check:
+                when, op, n, deadline = events[event_index]
+                event_index += 1
+                clock.advance_to(when)
+                task_id = ids.get(n)
+                if op == 'add':
+                    task = manager.add_task(f"課題{n}", deadline.strftime(DEADLINE_FORMAT))
+                    ids[n] = task['id']
+                    history[task['id']] = {'deadlines': [(when, deadline)], 'closed': None}
+                elif task_id is None or history[task_id]['closed']:
+                    continue
+                elif op == 'edit':
+                    task = manager.get_task(task_id)
+                    manager.update_task(task_id, task['name'], deadline.strftime(DEADLINE_FORMAT), task['priority'])
+                    ledger.discard(task_id)
+                    history[task_id]['deadlines'].append((when, deadline))
+                elif op == 'complete':
+                    manager.complete_task(task_id)
+                    ledger.discard(task_id)
+                    history[task_id]['closed'] = when
+                elif op == 'delete':
+                    manager.delete_task(task_id)
+                    ledger.discard(task_id)
+                    history[task_id]['closed'] = when
+
+            clock.advance_to(next_check)
+            del raw_alerts[:]
+            cpu_start = time.process_time()
+            alerts = checker.check()
+            pass_cpu.append(time.process_time() - cpu_start)
+
+            for key, _, tasks in alerts:
+                hours = {k: h for h, k, _ in TIME_WINDOWS}[key]
+                for task in tasks:
+                    deadline = datetime.strptime(task['deadline'], DEADLINE_FORMAT)
+                    fired.append((task['id'], key, next_check, deadline - timedelta(hours=hours)))
+
+            # チェッカーの通知をディスパッチャでまとめた場合の配送数
+            if raw_alerts:
+                dispatcher.dispatch(list(raw_alerts))
+
+        expected = expected_alerts(history, last_check)
+
+    return summarize(task_count, weeks, pass_cpu, fired, expected, len(sink.delivered))
+
+def summarize(task_count, weeks, pass_cpu, fired, expected, delivered):
+    seen = Counter((task_id, key) for task_id, key, _, _ in fired)
+
+    report = {
+        'tasks': task_count,
+        'weeks': weeks,
+        'passes': len(pass_cpu),
+        'cpu_ms_mean': statistics.mean(pass_cpu) * 1000 if pass_cpu else 0.0,
+        'cpu_ms_max': max(pass_cpu) * 1000 if pass_cpu else 0.0,
+        'alerts': len(fired),
+        # 本来の回数より多い通知
+        'duplicates': sum(max(0, c - expected[k]) for k, c in seen.items()),
+        'delivered_notifications': delivered,
+        'thresholds': {},
+    }
+    for hours, key, label in TIME_WINDOWS:
+        lateness = [(at - due).total_seconds() / 60 for _, k, at, due in fired if k == key]
+        report['thresholds'][key] = {
+            'label': label,
+            'alerts': len(lateness),
+            'expected': sum(c for k, c in expected.items() if k[1] == key),
+            'missed': sum(max(0, c - seen[k]) for k, c in expected.items() if k[1] == key),
+            'lateness_min_mean': statistics.mean(lateness) if lateness else 0.0,
+            'lateness_min_max': max(lateness) if lateness else 0.0,
+        }
+    return report
+
+def format_report(report):
+    lines = [
+        f"タスク数: {report['tasks']}  期間: {report['weeks']}週  チェック回数: {report['passes']}",
+        f"チェック1回のCPU時間: 平均 {report['cpu_ms_mean']:.2f}ms / 最大 {report['cpu_ms_max']:.2f}ms",
+        f"通知対象: {report['alerts']}件  重複: {report['duplicates']}件  "
+        f"まとめた後の配送数: {report['delivered_notifications']}件",
+    ]
+    for key, t in report['thresholds'].items():
+        lines.append(f"  {t['label']}前: 通知 {t['alerts']} / 本来 {t['expected']}  漏れ {t['missed']}  "
+                     f"遅れ 平均 {t['lateness_min_mean']:.1f}分 / 最大 {t['lateness_min_max']:.1f}分")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='締め切り通知の仮想時間シミュレーション')
+    parser.add_argument('--tasks', type=int, default=3000, help='タスク数 (デフォルト: 3000)')
+    parser.add_argument('--weeks', type=int, default=8, help='再生する週数 (デフォルト: 8)')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = run_simulation(args.tasks, args.weeks, args.seed)
+    print(format_report(report))
+    print(f"実時間: {time.perf_counter() - started:.1f}秒")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import bisect
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from task_manager import open_task_manager
+
+class StoreRegistry:
+    """複数のタスクファイルをキーで開くレジストリ
+
+    開いたストアは容量付きLRUで保持し、追い出す時に書き出して閉じる。
+    各ストアの未完了タスクの期限一覧（サマリ）を索引ファイルに保存しておき、
+    ストアをまたぐ期限の問い合わせではサマリで該当しないストアを読み込まずに済ませる。
+    """
+
+    def __init__(self, index_file='stores_index.json', capacity=8):
+        self.index_file = index_file
+        self.capacity = capacity
+        self.stores = OrderedDict()  # {key: manager} 最近使った順
+        self.opened_versions = {}  # {key: 開いた時点のバージョン}
+        self.index = self.load_index()  # {key: {'path', 'mtime', 'size', 'deadlines'}}
+        self.index_dirty = False
+
+    def load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (ValueError, OSError):
+                return {}
+        return {}
+
+    def save_index(self):
+        if not self.index_dirty:
+            return
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp_file, self.index_file)
+        self.index_dirty = False
+
+    def register(self, key, path):
+        entry = self.index.get(key)
+        if entry is None or entry['path'] != path:
+            self.index[key] = {'path': path, 'mtime': None, 'size': None, 'deadlines': []}
+            self.index_dirty = True
+
+    def keys(self):
+        return list(self.index)
+
+    def open(self, key):
+        """ストアを開く（LRUにあれば再利用）"""
+        manager = self.stores.get(key)
+        if manager is not None:
+            self.stores.move_to_end(key)
+            return manager
+
+        entry = self.index.get(key)
+        if entry is None:
+            raise KeyError(f"登録されていないストアです: {key}")
+        manager = open_task_manager(entry['path'])
+        self.stores[key] = manager
+        self.opened_versions[key] = manager.version
+        while len(self.stores) > self.capacity:
+            oldest_key = next(iter(self.stores))
+            self.evict(oldest_key)
+        return manager
+
+    def evict(self, key):
+        """ストアを書き出して閉じ、サマリを更新"""
+        manager = self.stores.pop(key, None)
+        if manager is None:
+            return
+        # 開いてから変更があった時だけ書き出してサマリを作り直す
+        changed = manager.version != self.opened_versions.pop(key)
+        if changed:
+            manager.save_tasks()
+        if changed or not self.summary_is_fresh(key):
+            self.update_summary(key, manager)
+        if hasattr(manager, 'close'):
+            manager.close()
+
+    def close(self):
+        for key in list(self.stores):
+            self.evict(key)
+        self.save_index()
+
+    def update_summary(self, key, manager):
+        deadlines = []
+        for task in manager.snapshot().get_active_tasks():
+            try:
+                deadline_dt = datetime.strptime(task['deadline'], '%Y-%m-%d %H:%M')
+            except (ValueError, TypeError):
+                continue
+            deadlines.append(int(deadline_dt.timestamp()))
+        deadlines.sort()
+
+        entry = self.index[key]
+        entry['deadlines'] = deadlines
+        if os.path.exists(entry['path']):
+            stat = os.stat(entry['path'])
+            entry['mtime'], entry['size'] = stat.st_mtime, stat.st_size
+        self.index_dirty = True
+
+    def summary_is_fresh(self, key):
+        entry = self.index[key]
+        if not os.path.exists(entry['path']):
+            # ファイルが無ければタスクも無い
+            return True
+        stat = os.stat(entry['path'])
+        return entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size
+
+    def may_have_deadline(self, key, start_epoch, end_epoch):
+        deadlines = self.index[key]['deadlines']
+        i = bisect.bisect_left(deadlines, start_epoch)
+        return i < len(deadlines) and deadlines[i] < end_epoch
+
+    def due_within(self, hours=24, now=None, keys=None):
+        """now〜now+hours に期限が来る未完了タスクを (キー, タスク) で返す
+
+        keys を省略すると索引に登録されたすべてのストアを対象にする。
+        """
+        if now is None:
+            now = datetime.now()
+        end = now + timedelta(hours=hours)
+        start_epoch, end_epoch = int(now.timestamp()), int(end.timestamp())
+
+        results = []
+        for key in (self.keys() if keys is None else keys):
+            # 閉じていてサマリが最新なら、該当が無いストアは読み込まない
+            if key not in self.stores and self.summary_is_fresh(key):
+                if not self.may_have_deadline(key, start_epoch, end_epoch):
+                    continue
+
+            manager = self.open(key)
+            for task in manager.snapshot().get_active_tasks():
+                try:
+                    deadline_dt = datetime.strptime(task['deadline'], '%Y-%m-%d %H:%M')
+                except (ValueError, TypeError):
+                    continue
+                if now <= deadline_dt < end:
+                    results.append((key, task))
+
+        results.sort(key=lambda r: r[1]['deadline'])
+        return results
@@ -0,0 +1,175 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+# 期限なしのタスクは最後に並べる（期限文字列は辞書順で比較できる）
+NO_DEADLINE = '9999-12-31 23:59'
+
+class TaskGraph:
+    """サブタスク（親子）と依存（先行タスク）のグラフ
+
+    タスクの 'parent'（親タスクID）と 'blocked_by'（先行タスクIDのリスト）から作る。
+    辺の向きは「先に終わらせる側 → 後の側」で、子 → 親、先行タスク → 後続タスク。
+
+    変更のあったタスクだけを update/remove で反映し、以下を差分で保つ。
+      - open_count: 未完了の先行タスクと子タスクの数（0なら今すぐ着手できる）
+      - effective: 実質の期限（自分と、後に控えるすべてのタスクの期限の最小値）
+      - ready: 着手できる未完了タスクを実質の期限順に並べたリスト
+    存在しないタスクへの参照は無視する（削除を元に戻すと関係も戻る）。
+    """
+
+    def __init__(self, tasks=()):
+        self.deadline = {}  # {task_id: 期限文字列}
+        self.active = set()  # 未完了のタスク
+        self.parent = {}  # {task_id: 親タスクID}
+        self.children = defaultdict(set)  # {親タスクID: 子タスクIDの集合}
+        self.blocked_by = {}  # {task_id: 先行タスクIDの集合}
+        self.blocks = defaultdict(set)  # {先行タスクID: 後続タスクIDの集合}
+        self.open_count = {}
+        self.effective = {}
+        self.ready = []  # [(実質の期限, task_id)]
+        self.ready_key = {}  # {task_id: ready に入っているキー}
+        for task in tasks:
+            self.update(task)
+
+    def update(self, task):
+        """タスクの追加・変更を反映"""
+        self._set(task['id'], task)
+
+    def remove(self, task_id):
+        """タスクの削除を反映"""
+        self._set(task_id, None)
+
+    def _set(self, task_id, task):
+        was_active = task_id in self.active
+        old_parent = self.parent.pop(task_id, None)
+        old_blockers = self.blocked_by.pop(task_id, set())
+        if old_parent is not None:
+            self.children[old_parent].discard(task_id)
+        for blocker in old_blockers:
+            self.blocks[blocker].discard(task_id)
+
+        new_parent, new_blockers = None, set()
+        if task is None:
+            self.deadline.pop(task_id, None)
+            self.active.discard(task_id)
+        else:
+            self.deadline[task_id] = task.get('deadline') or NO_DEADLINE
+            if task.get('completed'):
+                self.active.discard(task_id)
+            else:
+                self.active.add(task_id)
+            new_parent = task.get('parent')
+            new_blockers = set(task.get('blocked_by') or ())
+            if new_parent is not None:
+                self.parent[task_id] = new_parent
+                self.children[new_parent].add(task_id)
+            if new_blockers:
+                self.blocked_by[task_id] = new_blockers
+                for blocker in new_blockers:
+                    self.blocks[blocker].add(task_id)
+
+        # 未完了の数が変わりうるタスクだけ数え直す
+        recount = {task_id, old_parent, new_parent}
+        dirty = set()
+        if was_active != (task_id in self.active):
+            recount |= self.blocks.get(task_id, set())
+            # 期限なしのタスクは完了しても実質の期限が変わらないので、ここで必ず見直す
+            dirty.add(task_id)
+        recount.discard(None)
+        for node in recount:
+            if node not in self.deadline:
+                self.open_count.pop(node, None)
+                dirty.add(node)
+                continue
+            count = (sum(1 for b in self.blocked_by.get(node, ()) if b in self.active)
+                     + sum(1 for c in self.children.get(node, ()) if c in self.active))
+            if self.open_count.get(node) != count:
+                self.open_count[node] = count
+                dirty.add(node)
+
+        # 自分と、後続の集合が変わった先行タスクから実質の期限を伝える
+        dirty |= self._propagate({task_id} | (old_blockers ^ new_blockers))
+        for node in dirty:
+            self._refresh_ready(node)
+
+    def _compute(self, node):
+        if node not in self.deadline:
+            return None
+        if node not in self.active:
+            return NO_DEADLINE
+        candidates = [self.deadline[node]]
+        for after in self.blocks.get(node, ()):
+            if after in self.effective:
+                candidates.append(self.effective[after])
+        parent = self.parent.get(node)
+        if parent in self.effective:
+            candidates.append(self.effective[parent])
+        return min(candidates)
+
+    def _propagate(self, start):
+        """実質の期限を再計算し、変わったものだけ先行側へ伝える（変わったタスクを返す）"""
+        changed = set()
+        stack = list(start)
+        while stack:
+            node = stack.pop()
+            value = self._compute(node)
+            if value == self.effective.get(node):
+                continue
+            if value is None:
+                del self.effective[node]
+            else:
+                self.effective[node] = value
+            changed.add(node)
+            stack.extend(self.blocked_by.get(node, ()))
+            stack.extend(self.children.get(node, ()))
+        return changed
+
+    def _refresh_ready(self, node):
+        old_key = self.ready_key.pop(node, None)
+        if old_key is not None:
+            i = bisect_left(self.ready, (old_key, node))
+            del self.ready[i]
+        if node in self.active and self.open_count.get(node) == 0:
+            key = self.effective[node]
+            insort(self.ready, (key, node))
+            self.ready_key[node] = key
+
+    def creates_cycle(self, before, after):
+        """before → after の辺を加えると循環するか（after から before に辿り着けるか）"""
+        if before == after:
+            return True
+        seen = set()
+        stack = [after]
+        while stack:
+            node = stack.pop()
+            if node == before:
+                return True
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(self.blocks.get(node, ()))
+            if node in self.parent:
+                stack.append(self.parent[node])
+        return False
+
+    def next_ids(self, limit=None):
+        """今すぐ着手できるタスクのID（実質の期限が近い順）"""
+        ids = [task_id for _, task_id in self.ready]
+        return ids if limit is None else ids[:limit]
+
+    def effective_deadline(self, task_id):
+        """実質の期限（期限なし・完了済みならNone）"""
+        value = self.effective.get(task_id)
+        return None if value in (None, NO_DEADLINE) else value
+
+    def open_blockers(self, task_id):
+        """未完了の先行タスクのID"""
+        return sorted(b for b in self.blocked_by.get(task_id, ()) if b in self.active)
+
+    def is_blocked(self, task_id):
+        return bool(self.open_blockers(task_id))
+
+    def parent_of(self, task_id):
+        """親タスクのID（親が存在しなければNone）"""
+        parent = self.parent.get(task_id)
+        return parent if parent in self.deadline else None
@@ -1,63 +1,398 @@
-import json
+import copy
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from types import MappingProxyType
+import task_storage
+from undo_history import UndoHistory, history_file
+from task_graph import TaskGraph
+from ics_export import open_auto_exporter
+
+class TaskSnapshot:
+    """ある時点のタスク一覧の読み取り専用スナップショット
+
+    バックグラウンドスレッド（締め切りチェック・トレイ・エクスポート）は
+    ロックを取らずにこれを参照する。書き込み側は新しいスナップショットを
+    作って差し替えるだけなので、一度受け取ったスナップショットは変化しない。
+    """
+    __slots__ = ('version', 'tasks', 'next_id')
+
+    def __init__(self, version, tasks, next_id):
+        self.version = version
+        self.tasks = tasks  # tuple of MappingProxyType
+        self.next_id = next_id
+
+    def get_active_tasks(self):
+        return [t for t in self.tasks if not t['completed']]
+
+    def get_all_tasks(self):
+        return list(self.tasks)
+
+    def get_task(self, task_id: int):
+        for t in self.tasks:
+            if t['id'] == task_id:
+                return t
+        return None
+
+def freeze_task(task):
+    """タスクを読み取り専用にする（リストの項目はタプルにして共有を断つ）"""
+    return MappingProxyType({k: tuple(v) if isinstance(v, list) else v for k, v in task.items()})
 
 class TaskManager:
-    def __init__(self, json_file='student_tasks.json'):
+    MIN_PRIORITY = 1
+    MAX_PRIORITY = 3
+    
+    def __init__(self, json_file='student_tasks.json', storage_format=None, undo_depth=50):
         self.json_file = json_file
+        # 保存形式（Noneなら既存ファイルの形式を引き継ぎ、新規はJSON）
+        self.storage_format = storage_format
+        # 書き込みはすべてこのロックで直列化する
+        self.write_lock = threading.RLock()
+        self._pending = []  # 保存前の差分（保存後に1件の履歴として積む）
+        self._batch_changed = None  # 一括操作中に変更したタスクID
+        self._graph = None  # サブタスク・依存のグラフ（初回使用時に作る）
+        # iCalendarの自動書き出し（export-ics --auto で有効にした場合のみ）
+        self.ics_exporter = open_auto_exporter(json_file, self.MIN_PRIORITY, self.MAX_PRIORITY)
+        self._frozen = {}  # {task_id: MappingProxyType} 変更のないタスクは次のスナップショットでも使い回す
+        self._snapshot = None
         self.tasks = self.load_tasks()
+        # 元に戻す/やり直しの履歴（操作ごとの差分をタスクデータの隣に記録）
+        self.history = UndoHistory(history_file(json_file), undo_depth, self._file_state())
+        self._publish()
     
     def load_tasks(self):
-        if os.path.exists(self.json_file):
-            with open(self.json_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {'tasks': [], 'next_id': 1}
+        # JSON/バイナリは先頭バイトで自動判定
+        document, detected_format = task_storage.load_document(self.json_file)
+        if self.storage_format is None:
+            self.storage_format = detected_format or task_storage.FORMAT_JSON
+        return document
     
     def save_tasks(self):
-        with open(self.json_file, 'w', encoding='utf-8') as f:
-            json.dump(self.tasks, f, ensure_ascii=False, indent=2)
+        task_storage.save_document(self.json_file, self.tasks, self.storage_format)
+    
+    @property
+    def version(self):
+        """コミットごとに増えるバージョン番号"""
+        return self._snapshot.version
+    
+    def snapshot(self) -> TaskSnapshot:
+        """最新のスナップショットを返す（ロック不要）"""
+        return self._snapshot
+    
+    def _publish(self, changed_ids=None):
+        """コミット後に新しいスナップショットを公開する"""
+        if changed_ids is None:
+            self._frozen = {}
+        else:
+            for task_id in changed_ids:
+                self._frozen.pop(task_id, None)
+        
+        frozen = []
+        fresh = {}
+        for t in self.tasks['tasks']:
+            proxy = self._frozen.get(t['id'])
+            if proxy is None:
+                proxy = freeze_task(t)
+                self._frozen[t['id']] = proxy
+                fresh[t['id']] = proxy
+            frozen.append(proxy)
+        
+        # グラフは変わったタスクだけ反映する
+        if changed_ids is None:
+            self._graph = None
+        elif self._graph is not None:
+            for task_id in changed_ids:
+                if task_id in fresh:
+                    self._graph.update(fresh[task_id])
+                else:
+                    self._graph.remove(task_id)
+        
+        # 開いた時は、前回の書き出し以降にファイルが変わっていなければ突き合わせない
+        if self.ics_exporter is not None and (changed_ids is not None or not self.ics_exporter.is_current()):
+            self.export_ics(changed_ids)
+        
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        self._snapshot = TaskSnapshot(version, tuple(frozen), self.tasks['next_id'])
+    
+    def export_ics(self, changed_ids=None):
+        """変更のあったタスクの予定だけをiCalendarファイルに反映"""
+        try:
+            self.ics_exporter.sync(self._frozen, changed_ids)
+        except OSError as e:
+            # 書き出しに失敗してもタスクの保存は止めない
+            print(f"iCalendar書き出しエラー: {e}")
+    
+    def _file_state(self):
+        """保存済みのタスクファイルの状態（履歴との対応を確かめるため）"""
+        try:
+            stat = os.stat(self.json_file)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+    
+    def _commit(self, changed_ids):
+        # 一括操作中は最後にまとめて保存する
+        if self._batch_changed is not None:
+            self._batch_changed.update(changed_ids)
+            # 循環の判定に使うので、グラフだけは一括操作中もすぐに反映する
+            if self._graph is not None:
+                for task_id in changed_ids:
+                    index = self._find_index(task_id)
+                    if index is None:
+                        self._graph.remove(task_id)
+                    else:
+                        self._graph.update(self.tasks['tasks'][index])
+            return
+        self.save_tasks()
+        self._publish(changed_ids)
+        if self._pending:
+            deltas, self._pending = self._pending, []
+            self.history.push(deltas, self._file_state())
+    
+    def _record(self, delta):
+        # 差分は作業中のタスクとリストを共有しないよう複製して持つ
+        self._pending.append(copy.deepcopy(delta))
+    
+    @contextmanager
+    def batch(self):
+        """複数の操作を1回の保存・1件の履歴にまとめる"""
+        with self.write_lock:
+            if self._batch_changed is not None:
+                # 入れ子の場合は外側にまとめる
+                yield
+                return
+            self._batch_changed = set()
+            try:
+                yield
+            finally:
+                changed, self._batch_changed = self._batch_changed, None
+                if changed or self._pending:
+                    self._commit(changed)
+    
+    def _find_index(self, task_id):
+        for i, task in enumerate(self.tasks['tasks']):
+            if task['id'] == task_id:
+                return i
+        return None
+    
+    @staticmethod
+    def _same_task(a, b):
+        # 値がNoneの項目は無いものとして比べる
+        return ({k: v for k, v in a.items() if v is not None}
+                == {k: v for k, v in b.items() if v is not None})
+    
+    def _apply(self, delta, inverse):
+        """差分を適用（inverse=Trueなら取り消し）し、変更したタスクIDを返す
+        
+        現在のタスクが差分の前提と食い違う場合は何も変えずにNoneを返す。
+        """
+        kind = delta[0]
+        if kind == 'set':
+            _, task_id, before, after = delta
+            if inverse:
+                before, after = after, before
+            index = self._find_index(task_id)
+            if index is None:
+                return None
+            task = self.tasks['tasks'][index]
+            if any(task.get(k) != v for k, v in before.items()):
+                return None
+            task.update(copy.deepcopy(after))
+            return task_id
+        
+        _, task, index = delta
+        current = self._find_index(task['id'])
+        if (kind == 'add') == inverse:
+            # 追加の取り消し / 削除のやり直し（記録と同じタスクだけ消す）
+            if current is None or not self._same_task(self.tasks['tasks'][current], task):
+                return None
+            del self.tasks['tasks'][current]
+        else:
+            # 削除の取り消し / 追加のやり直し（元の位置に戻す）
+            if current is not None:
+                return None
+            self.tasks['tasks'].insert(min(index, len(self.tasks['tasks'])), copy.deepcopy(task))
+        return task['id']
+    
+    def _apply_entry(self, entry, inverse):
+        """履歴1件を適用する。途中で食い違えば適用済みの分を戻してValueError"""
+        deltas = list(reversed(entry)) if inverse else list(entry)
+        changed = []
+        for delta in deltas:
+            task_id = self._apply(delta, inverse)
+            if task_id is None:
+                for done in reversed(deltas[:len(changed)]):
+                    self._apply(done, not inverse)
+                self.history.clear()
+                raise ValueError("履歴がタスクファイルの内容と一致しないため、元に戻す履歴を破棄しました")
+            changed.append(task_id)
+        return changed
+    
+    def undo(self):
+        """直前の操作を取り消し、取り消した差分のリストを返す（無ければNone）"""
+        with self.write_lock:
+            entry = self.history.peek_undo()
+            if entry is None:
+                return None
+            changed = self._apply_entry(entry, inverse=True)
+            self.save_tasks()
+            self._publish(changed)
+            self.history.undone(self._file_state())
+            return entry
+    
+    def redo(self):
+        """取り消した操作をやり直し、やり直した差分のリストを返す（無ければNone）"""
+        with self.write_lock:
+            entry = self.history.peek_redo()
+            if entry is None:
+                return None
+            changed = self._apply_entry(entry, inverse=False)
+            self.save_tasks()
+            self._publish(changed)
+            self.history.redone(self._file_state())
+            return entry
     
     def add_task(self, name: str, deadline: str, priority: int = 2, deadline_time: str = '23:59'):
-        if priority < 1 or priority > 3:
-            priority = max(1, min(3, priority))
+        if priority < self.MIN_PRIORITY or priority > self.MAX_PRIORITY:
+            priority = max(self.MIN_PRIORITY, min(self.MAX_PRIORITY, priority))
         
         # 日付と時刻を結合
         if ' ' not in deadline:  # 時刻が含まれていない場合
             deadline = f"{deadline} {deadline_time}"
         
-        task = {
-            'id': self.tasks['next_id'],
-            'name': name,
-            'deadline': deadline,
-            'priority': priority,
-            'completed': False
-        }
-        
-        self.tasks['tasks'].append(task)
-        self.tasks['next_id'] += 1
-        self.save_tasks()
+        with self.write_lock:
+            task = {
+                'id': self.tasks['next_id'],
+                'name': name,
+                'deadline': deadline,
+                'priority': priority,
+                'completed': False
+            }
+            
+            self.tasks['tasks'].append(task)
+            self.tasks['next_id'] += 1
+            self._record(['add', dict(task), len(self.tasks['tasks']) - 1])
+            self._commit([task['id']])
         return task
     
+    def _set_fields(self, index, fields):
+        """タスクの項目を変更し、実際に変わった項目だけを差分として残す"""
+        task = self.tasks['tasks'][index]
+        before = {k: task.get(k) for k, v in fields.items() if task.get(k) != v}
+        if before:
+            after = {k: fields[k] for k in before}
+            task.update(after)
+            self._record(['set', task['id'], before, after])
+            self._commit([task['id']])
+    
+    def update_task(self, task_id: int, name: str, deadline: str, priority: int) -> bool:
+        with self.write_lock:
+            index = self._find_index(task_id)
+            if index is None:
+                return False
+            self._set_fields(index, {
+                'name': name,
+                'deadline': deadline,
+                'priority': max(self.MIN_PRIORITY, min(self.MAX_PRIORITY, priority))
+            })
+            return True
+    
+    @property
+    def graph(self) -> TaskGraph:
+        """サブタスク・依存のグラフ（以降のコミットでは差分だけ更新）"""
+        with self.write_lock:
+            if self._graph is None:
+                self._graph = TaskGraph(self.tasks['tasks'])
+            return self._graph
+    
+    def set_parent(self, task_id: int, parent_id) -> bool:
+        """親タスクを設定（Noneで解除）。親子関係が循環する場合はValueError"""
+        with self.write_lock:
+            index = self._find_index(task_id)
+            if index is None or (parent_id is not None and self._find_index(parent_id) is None):
+                return False
+            if parent_id is not None and self.graph.creates_cycle(task_id, parent_id):
+                raise ValueError(f"タスク {parent_id} を親にすると関係が循環します")
+            self._set_fields(index, {'parent': parent_id})
+            return True
+    
+    def set_blockers(self, task_id: int, blocker_ids) -> bool:
+        """先行タスク（先に終わらせるタスク）を設定。依存が循環する場合はValueError"""
+        with self.write_lock:
+            index = self._find_index(task_id)
+            if index is None:
+                return False
+            blocker_ids = sorted(set(blocker_ids))
+            current = set(self.tasks['tasks'][index].get('blocked_by') or ())
+            # 新しく加える先行タスクだけ確認する（削除済みタスクへの既存の参照はそのまま残す）
+            if any(b not in current and self._find_index(b) is None for b in blocker_ids):
+                return False
+            for blocker_id in blocker_ids:
+                if blocker_id not in current and self.graph.creates_cycle(blocker_id, task_id):
+                    raise ValueError(f"タスク {blocker_id} を先行タスクにすると依存が循環します")
+            self._set_fields(index, {'blocked_by': blocker_ids})
+            return True
+    
+    def add_dependency(self, task_id: int, blocker_id: int) -> bool:
+        with self.write_lock:
+            task = self.get_task(task_id)
+            if task is None:
+                return False
+            return self.set_blockers(task_id, list(task.get('blocked_by') or ()) + [blocker_id])
+    
+    def remove_dependency(self, task_id: int, blocker_id: int) -> bool:
+        with self.write_lock:
+            task = self.get_task(task_id)
+            if task is None:
+                return False
+            return self.set_blockers(task_id, [b for b in task.get('blocked_by') or () if b != blocker_id])
+    
+    def next_tasks(self, limit=None):
+        """今すぐ着手できる未完了タスク（先行タスク・子タスクが終わったもの）を実質の期限順に返す"""
+        with self.write_lock:
+            ids = self.graph.next_ids(limit)
+            if self._batch_changed is not None:
+                # 一括操作中はスナップショットがまだ古いので、作業中のタスクから返す
+                live = {t['id']: t for t in self.tasks['tasks']}
+                return [dict(live[task_id]) for task_id in ids]
+            return [dict(self._frozen[task_id]) for task_id in ids]
+    
     def delete_task(self, task_id: int) -> bool:
-        original_count = len(self.tasks['tasks'])
-        self.tasks['tasks'] = [t for t in self.tasks['tasks'] if t['id'] != task_id]
-        
-        if len(self.tasks['tasks']) < original_count:
-            self.save_tasks()
+        with self.write_lock:
+            index = self._find_index(task_id)
+            if index is None:
+                return False
+            task = self.tasks['tasks'].pop(index)
+            self._record(['delete', dict(task), index])
+            self._commit([task_id])
             return True
-        return False
     
     def complete_task(self, task_id: int) -> bool:
-        for task in self.tasks['tasks']:
-            if task['id'] == task_id:
-                if not task['completed']:
-                    task['completed'] = True
-                    self.save_tasks()
-                    return True
-        return False
+        with self.write_lock:
+            index = self._find_index(task_id)
+            if index is None or self.tasks['tasks'][index]['completed']:
+                return False
+            self.tasks['tasks'][index]['completed'] = True
+            self._record(['set', task_id, {'completed': False}, {'completed': True}])
+            self._commit([task_id])
+            return True
+    
+    def get_task(self, task_id: int):
+        for t in self.tasks['tasks']:
+            if t['id'] == task_id:
+                return t
+        return None
     
     def get_active_tasks(self):
         return [t for t in self.tasks['tasks'] if not t['completed']]
     
     def get_all_tasks(self):
         return self.tasks['tasks']
+
+def open_task_manager(json_file='student_tasks.json'):
+    """ファイル形式に応じてタスクマネージャを開く（メモリマップ形式ならMappedTaskStore）"""
+    import mmap_store
+    if mmap_store.is_mapped_store(json_file):
+        return mmap_store.MappedTaskStore(json_file)
+    return TaskManager(json_file)
@@ -0,0 +1,207 @@
+import json
+from datetime import datetime
+import mmap_store
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MINUTES_PER_DAY = 24 * 60
+# 1970-01-01 は木曜日なので、月曜始まりの週に揃えるためのずれ
+WEEK_SHIFT_DAYS = 3
+
+# MappedTaskStore のレコード（32バイト）に対応する構造化dtype
+MAPPED_RECORD_DTYPE = [('id', '<u4'), ('deadline', '<i8'), ('priority', 'u1'), ('status', 'u1'),
+                       ('pad', 'V2'), ('name_offset', '<u8'), ('name_length', '<u4'), ('pad2', 'V4')]
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("集計にはnumpyが必要です（pip install numpy）")
+
+def to_minutes(dt):
+    """datetimeを壁時計基準の分（1970-01-01 00:00 からの分数）に変換"""
+    return int(np.datetime64(dt.replace(second=0, microsecond=0), 'm').astype(np.int64))
+
+def minutes_to_str(minutes, fmt='%Y-%m-%d %H:%M'):
+    return np.datetime64(int(minutes), 'm').astype(datetime).strftime(fmt)
+
+def epochs_to_minutes(epochs):
+    """epoch秒（UTC）の配列を壁時計の分に変換（夏時間をまたぐ値もその時点のずれで変換）"""
+    unique, inverse = np.unique(epochs, return_inverse=True)
+    minutes = np.fromiter((to_minutes(datetime.fromtimestamp(int(e))) for e in unique),
+                          dtype=np.int64, count=len(unique))
+    return minutes[inverse]
+
+def parse_deadlines(deadlines):
+    """期限文字列の配列を分単位の整数配列に変換（解析できないものは NaT → 除外用のマスク）"""
+    # 時刻のない期限（以前のCLIで追加したもの）は、メモリマップ形式と同じくその日の23:59とする
+    deadlines = [f"{d} 23:59" if isinstance(d, str) and len(d) == 10 else d for d in deadlines]
+    try:
+        parsed = np.array(deadlines, dtype='datetime64[m]')
+    except ValueError:
+        # 不正な文字列が混ざっている時だけ1件ずつ解析
+        parsed = np.empty(len(deadlines), dtype='datetime64[m]')
+        for i, deadline in enumerate(deadlines):
+            try:
+                parsed[i] = np.datetime64(deadline, 'm')
+            except ValueError:
+                parsed[i] = np.datetime64('NaT')
+    valid = ~np.isnat(parsed)
+    return parsed.astype(np.int64), valid
+
+def task_arrays(manager):
+    """タスクストアから (期限[分], 優先度, 完了フラグ) の配列を作る"""
+    require_numpy()
+
+    if isinstance(manager, mmap_store.MappedTaskStore):
+        # レコード領域をそのまま構造化配列として読む（タスク名は読まない）
+        end = mmap_store.HEADER_SIZE + manager.count * mmap_store.RECORD.size
+        records = np.frombuffer(manager.mm[mmap_store.HEADER_SIZE:end], dtype=MAPPED_RECORD_DTYPE)
+        status = records['status']
+        records = records[(status & mmap_store.STATUS_DELETED) == 0]
+        epochs = records['deadline']
+        valid = epochs != mmap_store.NO_DEADLINE
+        deadlines = epochs_to_minutes(epochs[valid])
+        completed = (records['status'] & mmap_store.STATUS_COMPLETED) != 0
+        return deadlines, records['priority'][valid].astype(np.int8), completed[valid]
+
+    tasks = manager.snapshot().tasks
+    deadlines, valid = parse_deadlines([t['deadline'] for t in tasks])
+    priorities = np.fromiter((t['priority'] for t in tasks), dtype=np.int8, count=len(tasks))
+    completed = np.fromiter((t['completed'] for t in tasks), dtype=bool, count=len(tasks))
+    return deadlines[valid], priorities[valid], completed[valid]
+
+def week_start(minutes):
+    """分の配列を、その週の月曜日の日番号に変換"""
+    days = minutes // MINUTES_PER_DAY
+    return (days + WEEK_SHIFT_DAYS) // 7 * 7 - WEEK_SHIFT_DAYS
+
+def crunch_windows(deadlines, window_minutes, min_count):
+    """window_minutes 以内に min_count 件以上の期限が重なる区間を結合して返す"""
+    deadlines = np.sort(deadlines)
+    n = len(deadlines)
+    if n < min_count:
+        return []
+
+    # 各期限から始まる窓に入る件数
+    window_end_idx = np.searchsorted(deadlines, deadlines + window_minutes, side='right')
+    counts = window_end_idx - np.arange(n)
+    starts = np.flatnonzero(counts >= min_count)
+    if len(starts) == 0:
+        return []
+
+    start_times = deadlines[starts]
+    end_times = deadlines[window_end_idx[starts] - 1]
+    # 終了時刻は単調増加なので、前の区間の終わりより後に始まる所で区切る
+    breaks = np.flatnonzero(start_times[1:] > end_times[:-1]) + 1
+    group_starts = np.concatenate(([0], breaks))
+    group_ends = np.concatenate((breaks, [len(starts)])) - 1
+
+    merged_start = start_times[group_starts]
+    merged_end = end_times[group_ends]
+    merged_count = (np.searchsorted(deadlines, merged_end, side='right')
+                    - np.searchsorted(deadlines, merged_start, side='left'))
+    return [
+        {'start': minutes_to_str(s), 'end': minutes_to_str(e), 'count': int(c)}
+        for s, e, c in zip(merged_start, merged_end, merged_count)
+    ]
+
+def build_report(manager, now=None, upcoming_days=14, window_hours=48, min_count=3, high_priority=None):
+    """完了率・期限切れ・期限の分布・締め切りの集中する期間を集計"""
+    require_numpy()
+    if now is None:
+        now = datetime.now()
+    if high_priority is None:
+        high_priority = manager.MAX_PRIORITY
+
+    deadlines, priorities, completed = task_arrays(manager)
+    now_minutes = to_minutes(now)
+    today = now_minutes // MINUTES_PER_DAY
+
+    total = len(deadlines)
+    completed_count = int(completed.sum())
+    active = ~completed
+    active_count = total - completed_count
+    overdue = active & (deadlines < now_minutes)
+    overdue_count = int(overdue.sum())
+
+    # 週ごとの件数（期限のある週すべて）
+    weeks = week_start(deadlines)
+    due_by_week = []
+    overdue_by_week = []
+    if total:
+        first_week = int(weeks.min())
+        offsets = (weeks - first_week) // 7
+        week_total = np.bincount(offsets)
+        week_completed = np.bincount(offsets, weights=completed, minlength=len(week_total))
+        week_overdue = np.bincount(offsets, weights=overdue, minlength=len(week_total))
+        for i in np.flatnonzero(week_total):
+            label = minutes_to_str((first_week + 7 * i) * MINUTES_PER_DAY, '%Y-%m-%d')
+            due_by_week.append({'week': label, 'total': int(week_total[i]),
+                                'completed': int(week_completed[i])})
+            if week_overdue[i]:
+                overdue_by_week.append({'week': label, 'count': int(week_overdue[i])})
+
+    # 今日から upcoming_days 日間の未完了タスクの日別件数
+    days = deadlines[active] // MINUTES_PER_DAY - today
+    in_range = (days >= 0) & (days < upcoming_days)
+    day_counts = np.bincount(days[in_range], minlength=upcoming_days)
+    upcoming_by_day = [
+        {'date': minutes_to_str((today + i) * MINUTES_PER_DAY, '%Y-%m-%d'), 'count': int(c)}
+        for i, c in enumerate(day_counts)
+    ]
+
+    # 今後の優先度の高い未完了タスクが集中する期間
+    crunch_mask = active & (priorities >= high_priority) & (deadlines >= now_minutes)
+    crunch = crunch_windows(deadlines[crunch_mask], window_hours * 60, min_count)
+
+    return {
+        'generated_at': now.strftime('%Y-%m-%d %H:%M'),
+        'total': total,
+        'completed': completed_count,
+        'active': active_count,
+        'completion_rate': completed_count / total if total else 0.0,
+        'overdue': overdue_count,
+        'overdue_ratio': overdue_count / active_count if active_count else 0.0,
+        'overdue_by_week': overdue_by_week,
+        'due_by_week': due_by_week,
+        'upcoming_by_day': upcoming_by_day,
+        'crunch_windows': crunch,
+        'crunch_settings': {'window_hours': window_hours, 'min_count': min_count,
+                            'high_priority': high_priority},
+    }
+
+def format_json(report):
+    return json.dumps(report, ensure_ascii=False, indent=2)
+
+def format_text(report):
+    lines = [
+        f"集計日時: {report['generated_at']}",
+        f"タスク数: {report['total']} (完了 {report['completed']} / 未完了 {report['active']})",
+        f"完了率: {report['completion_rate']:.1%}",
+        f"期限切れ: {report['overdue']}件 (未完了の{report['overdue_ratio']:.1%})",
+        "",
+        "今後の日別件数:",
+    ]
+    for day in report['upcoming_by_day']:
+        lines.append(f"  {day['date']}  {day['count']:5d} {'#' * min(day['count'], 50)}")
+
+    lines.append("")
+    lines.append("週別の期限切れ件数:")
+    if report['overdue_by_week']:
+        for week in report['overdue_by_week']:
+            lines.append(f"  {week['week']}週  {week['count']:5d}")
+    else:
+        lines.append("  なし")
+
+    settings = report['crunch_settings']
+    lines.append("")
+    lines.append(f"締め切りの集中 (優先度{settings['high_priority']}以上が"
+                 f"{settings['window_hours']}時間以内に{settings['min_count']}件以上):")
+    if report['crunch_windows']:
+        for window in report['crunch_windows']:
+            lines.append(f"  {window['start']} 〜 {window['end']}  {window['count']}件")
+    else:
+        lines.append("  なし")
+    return "\n".join(lines)
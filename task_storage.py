@@ -0,0 +1,154 @@
+import json
+import os
+import struct
+from undo_history import discard_history
+
+# 保存形式
+FORMAT_JSON = 'json'
+FORMAT_BINARY = 'binary'
+FORMAT_MMAP = 'mmap'
+FORMATS = (FORMAT_JSON, FORMAT_BINARY, FORMAT_MMAP)
+
+# バイナリ形式（version 1）のレイアウト
+#   ヘッダ:     magic(4) version(u8) reserved(3) next_id(u32) task数(u32) 文字列数(u32) meta文字列(i32)
+#   文字列表:   [長さ(u32) + UTF-8] * 文字列数   タスク名・期限・追加情報を重複なしで格納
+#   レコード:   [id(u32) 名前(u32) 期限(u32) 優先度(u8) 完了(u8) 追加情報(i32)] * task数
+# 追加情報は id/name/deadline/priority/completed 以外のキーをJSONにしたもの（無ければ-1）
+MAGIC = b'UTSK'
+VERSION = 1
+HEADER = struct.Struct('<4sB3xIIIi')
+RECORD = struct.Struct('<IIIBBi')
+STRING_LEN = struct.Struct('<I')
+
+CORE_KEYS = ('id', 'name', 'deadline', 'priority', 'completed')
+
+def empty_document():
+    return {'tasks': [], 'next_id': 1}
+
+def detect_format(path):
+    """ファイル先頭のマジックから保存形式を判定"""
+    import mmap_store
+    with open(path, 'rb') as f:
+        head = f.read(len(MAGIC))
+    if head == mmap_store.MAGIC:
+        return FORMAT_MMAP
+    return FORMAT_BINARY if head == MAGIC else FORMAT_JSON
+
+def load_document(path):
+    """保存形式を自動判定して読み込み、(ドキュメント, 形式) を返す"""
+    if not os.path.exists(path):
+        return empty_document(), None
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] == MAGIC:
+        return decode_binary(data), FORMAT_BINARY
+    import mmap_store
+    if data[:len(mmap_store.MAGIC)] == mmap_store.MAGIC:
+        store = mmap_store.MappedTaskStore(path)
+        try:
+            return store.to_document(), FORMAT_MMAP
+        finally:
+            store.close()
+    return json.loads(data.decode('utf-8')), FORMAT_JSON
+
+def save_document(path, document, fmt=FORMAT_JSON, force=False):
+    if fmt == FORMAT_MMAP:
+        # 通常はMappedTaskStoreで直接更新する。ここは変換時の全体書き出し用
+        # （保持できない内容がある時は force=True でなければValueError）
+        import mmap_store
+        mmap_store.MappedTaskStore.create(path, document, force)
+        return
+    if fmt == FORMAT_BINARY:
+        data = encode_binary(document)
+    elif fmt == FORMAT_JSON:
+        data = json.dumps(document, ensure_ascii=False, indent=2).encode('utf-8')
+    else:
+        raise ValueError(f"不明な保存形式です: {fmt}")
+
+    # 書き込み途中で落ちても元のファイルが壊れないように置き換える
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def convert(src_path, dst_path, fmt, force=False):
+    """保存形式を変換し、変換元の形式を返す"""
+    document, src_fmt = load_document(src_path)
+    if src_fmt is None:
+        raise FileNotFoundError(src_path)
+    save_document(dst_path, document, fmt, force)
+    if fmt != FORMAT_MMAP and os.path.exists(f"{dst_path}.names"):
+        # メモリマップ形式から戻した時の名前の領域は不要
+        os.remove(f"{dst_path}.names")
+    # 変換先の元に戻す履歴は変換前の内容を前提にしているので捨てる
+    discard_history(dst_path)
+    return src_fmt
+
+def encode_binary(document):
+    strings = []
+    index = {}
+
+    def intern(value):
+        i = index.get(value)
+        if i is None:
+            i = len(strings)
+            index[value] = i
+            strings.append(value)
+        return i
+
+    meta = {k: v for k, v in document.items() if k not in ('tasks', 'next_id')}
+    meta_idx = intern(json.dumps(meta, ensure_ascii=False)) if meta else -1
+
+    records = bytearray()
+    pack_record = RECORD.pack
+    for task in document['tasks']:
+        extra = {k: v for k, v in task.items() if k not in CORE_KEYS}
+        extra_idx = intern(json.dumps(extra, ensure_ascii=False)) if extra else -1
+        records += pack_record(task['id'], intern(task['name']), intern(task['deadline']),
+                               task['priority'], 1 if task['completed'] else 0, extra_idx)
+
+    parts = [HEADER.pack(MAGIC, VERSION, document['next_id'], len(document['tasks']),
+                         len(strings), meta_idx)]
+    pack_len = STRING_LEN.pack
+    for value in strings:
+        encoded = value.encode('utf-8')
+        parts.append(pack_len(len(encoded)))
+        parts.append(encoded)
+    parts.append(bytes(records))
+    return b''.join(parts)
+
+def decode_binary(data):
+    magic, version, next_id, task_count, string_count, meta_idx = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("タスクファイルの形式が不正です")
+    if version != VERSION:
+        raise ValueError(f"未対応のタスクファイルのバージョンです: {version}")
+
+    view = memoryview(data)
+    offset = HEADER.size
+    strings = []
+    unpack_len = STRING_LEN.unpack_from
+    for _ in range(string_count):
+        (length,) = unpack_len(data, offset)
+        offset += STRING_LEN.size
+        strings.append(str(view[offset:offset + length], 'utf-8'))
+        offset += length
+
+    tasks = []
+    end = offset + task_count * RECORD.size
+    for task_id, name_idx, deadline_idx, priority, completed, extra_idx in RECORD.iter_unpack(view[offset:end]):
+        task = {
+            'id': task_id,
+            'name': strings[name_idx],
+            'deadline': strings[deadline_idx],
+            'priority': priority,
+            'completed': bool(completed)
+        }
+        if extra_idx >= 0:
+            task.update(json.loads(strings[extra_idx]))
+        tasks.append(task)
+
+    document = {'tasks': tasks, 'next_id': next_id}
+    if meta_idx >= 0:
+        document.update(json.loads(strings[meta_idx]))
+    return document
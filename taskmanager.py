@@ -1,49 +1,29 @@
-import json
 import argparse
 import sys
 import os
 from datetime import datetime
+from task_manager import TaskManager as BaseTaskManager
+from mmap_store import MappedTaskStore, is_mapped_store
+from store_registry import StoreRegistry
+import task_storage
+from undo_history import describe
+from ics_export import IcsExporter
 
-class TaskManager:
-    def __init__(self, json_file='student_tasks.json'):
-        self.json_file = json_file
-        self.tasks = self.load_tasks()
-    
-    def load_tasks(self):
-        if os.path.exists(self.json_file):
-            with open(self.json_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {'tasks': [], 'next_id': 1}
-    
-    def save_tasks(self):
-        with open(self.json_file, 'w', encoding='utf-8') as f:
-            json.dump(self.tasks, f, ensure_ascii=False, indent=2)
+class CLIOutputMixin:
+    """CLI用: 操作結果を表示し、優先度は1-5で扱う"""
+    MAX_PRIORITY = 5
     
     def add_task(self, name: str, deadline: str, priority: int = 3):
         if priority < 1 or priority > 5:
             priority = max(1, min(5, priority))
             print(f"優先度を {priority} に調整しました（範囲: 1-5）")
         
-        task = {
-            'id': self.tasks['next_id'],
-            'name': name,
-            'deadline': deadline,
-            'priority': priority,
-            'completed': False
-        }
-        
-        self.tasks['tasks'].append(task)
-        self.tasks['next_id'] += 1
-        self.save_tasks()
+        task = super().add_task(name, deadline, priority)
         print(f"タスクを追加しました: [ID: {task['id']}] {task['name']} (期限: {task['deadline']}, 優先度: {task['priority']})")
         return task
     
     def delete_task(self, task_id: int) -> bool:
-        original_count = len(self.tasks['tasks'])
-        self.tasks['tasks'] = [t for t in self.tasks['tasks'] if t['id'] != task_id]
-        
-        if len(self.tasks['tasks']) < original_count:
-            self.save_tasks()
+        if super().delete_task(task_id):
             print(f"タスク {task_id} を削除しました")
             return True
         else:
@@ -51,28 +31,23 @@ class TaskManager:
             return False
     
     def complete_task(self, task_id: int) -> bool:
-        task_found = False
-        
-        for task in self.tasks['tasks']:
-            if task['id'] == task_id:
-                if not task['completed']:
-                    task['completed'] = True
-                    task_found = True
-                    self.save_tasks()
-                    print(f"タスク {task_id} を完了しました")
-                else:
-                    print(f"タスク {task_id} は既に完了しています")
-                return True
-        
-        print(f"タスク {task_id} が見つかりません")
-        return False
+        task = self.get_task(task_id)
+        if task is None:
+            print(f"タスク {task_id} が見つかりません")
+            return False
+        
+        if super().complete_task(task_id):
+            print(f"タスク {task_id} を完了しました")
+        else:
+            print(f"タスク {task_id} は既に完了しています")
+        return True
     
     def list_tasks(self, show_all: bool = False):
         if show_all:
-            tasks_to_show = self.tasks['tasks']
+            tasks_to_show = list(self.get_all_tasks())
             print("タスク一覧:")
         else:
-            tasks_to_show = [t for t in self.tasks['tasks'] if not t['completed']]
+            tasks_to_show = self.get_active_tasks()
             print("残りのタスク一覧:")
         
         if not tasks_to_show:
@@ -85,9 +60,60 @@ class TaskManager:
             status = "✓" if task['completed'] else "○"
             print(f"  {status} [ID: {task['id']}] {task['name']} (期限: {task['deadline']}, 優先度: {task['priority']})")
 
+    def set_parent(self, task_id: int, parent_id) -> bool:
+        if not super().set_parent(task_id, parent_id):
+            print(f"タスク {task_id} または {parent_id} が見つかりません")
+            return False
+        if parent_id is None:
+            print(f"タスク {task_id} の親タスクを解除しました")
+        else:
+            print(f"タスク {task_id} をタスク {parent_id} のサブタスクにしました")
+        return True
+    
+    def add_dependency(self, task_id: int, blocker_id: int) -> bool:
+        if not super().add_dependency(task_id, blocker_id):
+            print(f"タスク {task_id} または {blocker_id} が見つかりません")
+            return False
+        print(f"タスク {task_id} はタスク {blocker_id} の完了待ちになりました")
+        return True
+    
+    def remove_dependency(self, task_id: int, blocker_id: int) -> bool:
+        if not super().remove_dependency(task_id, blocker_id):
+            print(f"タスク {task_id} が見つかりません")
+            return False
+        print(f"タスク {task_id} の先行タスク {blocker_id} を外しました")
+        return True
+    
+    def list_next_tasks(self, limit=None):
+        tasks = self.next_tasks(limit)
+        print("今すぐ取り組めるタスク:")
+        if not tasks:
+            print("タスクがありません")
+            return
+        
+        graph = self.graph
+        for task in tasks:
+            line = f"  ○ [ID: {task['id']}] {task['name']} (期限: {task['deadline']}, 優先度: {task['priority']})"
+            # 後に控えるタスクの方が期限が早い場合は実質の期限を示す
+            effective = graph.effective_deadline(task['id'])
+            if effective and effective < task['deadline']:
+                line += f" ※実質の期限: {effective}"
+            print(line)
+
+class TaskManager(CLIOutputMixin, BaseTaskManager):
+    pass
+
+class MappedTaskManager(CLIOutputMixin, MappedTaskStore):
+    pass
+
+def open_cli_manager(json_file='student_tasks.json'):
+    if is_mapped_store(json_file):
+        return MappedTaskManager(json_file)
+    return TaskManager(json_file)
+
 class TaskCLI:
     def __init__(self):
-        self.manager = TaskManager()
+        self.manager = open_cli_manager()
     
     def run(self, args):
         parser = argparse.ArgumentParser(description='大学生向けタスク管理システム')
@@ -97,6 +123,7 @@ class TaskCLI:
         add_parser.add_argument('name', help='タスク名')
         add_parser.add_argument('deadline', help='期限 (YYYY-MM-DD)')
         add_parser.add_argument('--priority', '-p', type=int, default=3, help='優先度 (1-5, デフォルト: 3)')
+        add_parser.add_argument('--parent', type=int, help='親タスクID（サブタスクとして追加）')
         
         list_parser = subparsers.add_parser('list', help='タスク一覧を表示')
         list_parser.add_argument('--all', action='store_true', help='完了済みタスクも表示')
@@ -107,6 +134,46 @@ class TaskCLI:
         delete_parser = subparsers.add_parser('delete', help='タスクを削除')
         delete_parser.add_argument('id', type=int, help='タスクID')
         
+        convert_parser = subparsers.add_parser('convert', help='タスクファイルの保存形式を変換')
+        convert_parser.add_argument('source', help='変換元のタスクファイル')
+        convert_parser.add_argument('dest', nargs='?', help='変換先（省略時は上書き）')
+        convert_parser.add_argument('--format', '-f', choices=task_storage.FORMATS, required=True,
+                                    help='変換後の形式 (json / binary / mmap)')
+        convert_parser.add_argument('--force', action='store_true',
+                                    help='変換後の形式で保持できない内容（mmapでの親子・依存など）を破棄して変換')
+        
+        due_parser = subparsers.add_parser('due', help='複数のタスクファイルから期限が近いタスクを表示')
+        due_parser.add_argument('files', nargs='+', help='タスクファイル')
+        due_parser.add_argument('--hours', type=int, default=24, help='何時間以内か (デフォルト: 24)')
+        due_parser.add_argument('--index', default='stores_index.json', help='ストア索引ファイル')
+        
+        report_parser = subparsers.add_parser('report', help='完了率・期限切れ・締め切りの集中を集計')
+        report_parser.add_argument('--json', action='store_true', help='JSONで出力')
+        report_parser.add_argument('--days', type=int, default=14, help='日別件数を表示する日数 (デフォルト: 14)')
+        report_parser.add_argument('--window', type=int, default=48, help='締め切りの集中を判定する時間幅 (デフォルト: 48)')
+        report_parser.add_argument('--min-count', type=int, default=3, help='集中とみなす件数 (デフォルト: 3)')
+        
+        next_parser = subparsers.add_parser('next', help='今すぐ取り組めるタスクを期限順に表示')
+        next_parser.add_argument('--limit', '-n', type=int, help='表示する件数')
+        
+        parent_parser = subparsers.add_parser('parent', help='親タスクを設定（省略で解除）')
+        parent_parser.add_argument('id', type=int, help='タスクID')
+        parent_parser.add_argument('parent', type=int, nargs='?', help='親タスクID')
+        
+        depend_parser = subparsers.add_parser('depend', help='先に終わらせるタスクを設定')
+        depend_parser.add_argument('id', type=int, help='タスクID')
+        depend_parser.add_argument('blockers', type=int, nargs='+', help='先行タスクID')
+        depend_parser.add_argument('--remove', action='store_true', help='先行タスクから外す')
+        
+        ics_parser = subparsers.add_parser('export-ics', help='期限をiCalendarファイルに書き出す')
+        ics_parser.add_argument('ics_file', nargs='?', help='書き出し先（省略時は前回の書き出し先か <タスクファイル名>.ics）')
+        auto_group = ics_parser.add_mutually_exclusive_group()
+        auto_group.add_argument('--auto', action='store_true', help='以降の変更のたびに自動で書き出す')
+        auto_group.add_argument('--no-auto', action='store_true', help='自動書き出しをやめる')
+        
+        subparsers.add_parser('undo', help='直前の操作を元に戻す')
+        subparsers.add_parser('redo', help='元に戻した操作をやり直す')
+        
         parsed_args = parser.parse_args(args)
         
         if not parsed_args.command:
@@ -115,16 +182,118 @@ class TaskCLI:
         
         try:
             if parsed_args.command == 'add':
-                self.manager.add_task(parsed_args.name, parsed_args.deadline, parsed_args.priority)
+                # 親タスクが無ければ追加もしない
+                if parsed_args.parent is not None and self.manager.get_task(parsed_args.parent) is None:
+                    print(f"親タスク {parsed_args.parent} が見つかりません")
+                    return
+                with self.manager.batch():
+                    task = self.manager.add_task(parsed_args.name, parsed_args.deadline, parsed_args.priority)
+                    if parsed_args.parent is not None:
+                        self.manager.set_parent(task['id'], parsed_args.parent)
             elif parsed_args.command == 'list':
                 self.manager.list_tasks(parsed_args.all)
             elif parsed_args.command == 'complete':
                 self.manager.complete_task(parsed_args.id)
             elif parsed_args.command == 'delete':
                 self.manager.delete_task(parsed_args.id)
+            elif parsed_args.command == 'convert':
+                self.convert(parsed_args.source, parsed_args.dest, parsed_args.format, parsed_args.force)
+            elif parsed_args.command == 'report':
+                self.report(parsed_args)
+            elif parsed_args.command == 'due':
+                self.due(parsed_args.files, parsed_args.hours, parsed_args.index)
+            elif parsed_args.command == 'next':
+                self.manager.list_next_tasks(parsed_args.limit)
+            elif parsed_args.command == 'parent':
+                self.manager.set_parent(parsed_args.id, parsed_args.parent)
+            elif parsed_args.command == 'depend':
+                for blocker_id in parsed_args.blockers:
+                    if parsed_args.remove:
+                        self.manager.remove_dependency(parsed_args.id, blocker_id)
+                    else:
+                        self.manager.add_dependency(parsed_args.id, blocker_id)
+            elif parsed_args.command == 'export-ics':
+                self.export_ics(parsed_args)
+            elif parsed_args.command == 'undo':
+                self.undo()
+            elif parsed_args.command == 'redo':
+                self.redo()
         except Exception as e:
             print(f"エラー: {e}")
 
+    def convert(self, source, dest, fmt, force=False):
+        dest = dest or source
+        src_fmt = task_storage.convert(source, dest, fmt, force)
+        print(f"{source} ({src_fmt}) を {dest} ({fmt}) に変換しました ({os.path.getsize(dest)} バイト)")
+
+    def due(self, files, hours, index_file):
+        registry = StoreRegistry(index_file)
+        # 同じファイル名の別ディレクトリ（科目ごと等）を区別するため、実際のパスをキーにする
+        labels = {}
+        for path in files:
+            key = os.path.realpath(path)
+            labels[key] = path
+            registry.register(key, key)
+        
+        try:
+            results = [(labels[key], task) for key, task in registry.due_within(hours, keys=list(labels))]
+        finally:
+            registry.close()
+        
+        print(f"{hours}時間以内に期限のタスク:")
+        if not results:
+            print("タスクがありません")
+            return
+        for key, task in results:
+            print(f"  [{key}] [ID: {task['id']}] {task['name']} (期限: {task['deadline']}, 優先度: {task['priority']})")
+
+    def export_ics(self, parsed_args):
+        exporter = IcsExporter(self.manager.json_file, parsed_args.ics_file,
+                               self.manager.MIN_PRIORITY, self.manager.MAX_PRIORITY)
+        tasks = {task['id']: task for task in self.manager.get_all_tasks()}
+        changed = exporter.sync(tasks)
+        print(f"{exporter.ics_file} に書き出しました（更新 {changed}件 / 予定 {len(exporter.events)}件）")
+        
+        if parsed_args.auto:
+            if isinstance(self.manager, MappedTaskStore):
+                print("この保存形式では自動書き出しに対応していません")
+                return
+            exporter.set_auto(True)
+            print("以降の変更は自動で書き出します")
+        elif parsed_args.no_auto:
+            exporter.set_auto(False)
+            print("自動書き出しをやめました")
+    
+    def undo(self):
+        if isinstance(self.manager, MappedTaskStore):
+            print("この保存形式では元に戻す操作に対応していません")
+            return
+        entry = self.manager.undo()
+        if entry is None:
+            print("元に戻す操作がありません")
+        else:
+            print(f"元に戻しました: {describe(entry)}")
+
+    def redo(self):
+        if isinstance(self.manager, MappedTaskStore):
+            print("この保存形式ではやり直しに対応していません")
+            return
+        entry = self.manager.redo()
+        if entry is None:
+            print("やり直す操作がありません")
+        else:
+            print(f"やり直しました: {describe(entry)}")
+
+    def report(self, parsed_args):
+        import task_report
+        report = task_report.build_report(self.manager, upcoming_days=parsed_args.days,
+                                          window_hours=parsed_args.window,
+                                          min_count=parsed_args.min_count)
+        if parsed_args.json:
+            print(task_report.format_json(report))
+        else:
+            print(task_report.format_text(report))
+
 if __name__ == '__main__':
     cli = TaskCLI()
     cli.run(sys.argv[1:])
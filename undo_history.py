@@ -0,0 +1,135 @@
+import json
+import os
+from collections import deque
+
+# 差分の種類
+#   ['add', タスク, 位置]       タスクの追加（取り消しで削除）
+#   ['delete', タスク, 位置]    タスクの削除（取り消しで元の位置に戻す）
+#   ['set', task_id, 変更前, 変更後]  項目の変更（変更した項目だけを持つ）
+# 1回の操作（一括操作を含む）は差分のリストで1件として記録する。
+DELTA_LABELS = {'add': '追加', 'delete': '削除', 'set': '変更'}
+
+def describe(entry):
+    """履歴1件の説明（例: "削除 3件"）"""
+    counts = {}
+    for delta in entry:
+        counts[delta[0]] = counts.get(delta[0], 0) + 1
+    return '、'.join(f"{DELTA_LABELS[kind]} {n}件" for kind, n in counts.items())
+
+def history_file(json_file):
+    """タスクファイルに対応する履歴ジャーナルのパス"""
+    # 拡張子だけ違うタスクファイル（tasks.json と tasks.bin）で共有しないようファイル名全体を使う
+    return f"{json_file}.history.jsonl"
+
+def discard_history(json_file):
+    """タスクファイルを丸ごと書き換えた時に、そのファイルの履歴を捨てる"""
+    path = history_file(json_file)
+    if os.path.exists(path):
+        os.remove(path)
+
+class UndoHistory:
+    """元に戻す/やり直しの履歴
+
+    履歴は操作ごとの差分だけを持ち、ジャーナルファイルに1行ずつ追記するので
+    1操作あたりのコストは変更の大きさに比例する（ドキュメント全体は複製しない）。
+    ジャーナルが深さの数倍に伸びたら現在の履歴だけで書き直す。
+
+    各行には保存直後のタスクファイルの状態（サイズと更新時刻）を添えておき、
+    読み込み時のファイルと一致しなければ（別の手段で書き換えられた等）履歴を捨てる。
+    """
+
+    def __init__(self, journal_file, depth=50, state=None):
+        self.journal_file = journal_file
+        self.depth = depth
+        self.undo_stack = deque(maxlen=depth)
+        self.redo_stack = deque(maxlen=depth)
+        self.journal_lines = 0
+        self.state = None
+        self.load()
+        if self.journal_lines and self.state != state:
+            print("タスクファイルが履歴の記録後に変更されているため、元に戻す履歴を破棄します")
+            self.clear()
+
+    def load(self):
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で落ちた最後の行は無視
+                    continue
+                self._replay(event)
+                self.state = event.get('state')
+                self.journal_lines += 1
+
+    def clear(self):
+        """履歴をすべて捨てる"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.journal_lines = 0
+        self.state = None
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def _replay(self, event):
+        if 'push' in event:
+            self.undo_stack.append(event['push'])
+            self.redo_stack.clear()
+        elif 'undo' in event and self.undo_stack:
+            self.redo_stack.append(self.undo_stack.pop())
+        elif 'redo' in event and self.redo_stack:
+            self.undo_stack.append(self.redo_stack.pop())
+
+    def _journal(self, event, state):
+        event['state'] = self.state = state
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.journal_lines += 1
+        if self.journal_lines > self.depth * 4:
+            self.compact()
+
+    def compact(self):
+        """現在の履歴を再現する最小のジャーナルに書き直す"""
+        events = [{'push': entry} for entry in self.undo_stack]
+        # やり直し履歴は、積んでから取り消すことで再現する
+        events += [{'push': entry} for entry in reversed(self.redo_stack)]
+        events += [{'undo': 1} for _ in self.redo_stack]
+        if events:
+            events[-1]['state'] = self.state
+
+        tmp_file = f"{self.journal_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n')
+        os.replace(tmp_file, self.journal_file)
+        self.journal_lines = len(events)
+
+    def push(self, entry, state):
+        """保存済みの操作を積む（state は保存後のタスクファイルの状態）"""
+        self.undo_stack.append(entry)
+        self.redo_stack.clear()
+        self._journal({'push': entry}, state)
+
+    def peek_undo(self):
+        return self.undo_stack[-1] if self.undo_stack else None
+
+    def peek_redo(self):
+        return self.redo_stack[-1] if self.redo_stack else None
+
+    def undone(self, state):
+        """peek_undo() の操作を取り消して保存した後に呼ぶ"""
+        self.redo_stack.append(self.undo_stack.pop())
+        self._journal({'undo': 1}, state)
+
+    def redone(self, state):
+        """peek_redo() の操作をやり直して保存した後に呼ぶ"""
+        self.undo_stack.append(self.redo_stack.pop())
+        self._journal({'redo': 1}, state)
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)